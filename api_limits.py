@@ -0,0 +1,106 @@
+import datetime
+import threading
+import time
+
+
+class RateLimiter:
+    # Token bucket shared by every request made to the API.
+    # Tokens are refilled at "requests_per_minute / 60" per second, and up to "burst"
+    # tokens can be accumulated while no requests are being made.
+    def __init__(self, requests_per_minute, burst=1):
+        self.rate = float(requests_per_minute) / 60
+        self.capacity = float(burst)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # Block until a token is available and return the seconds spent waiting.
+        # The token is reserved while holding the lock (the bucket can go negative), so
+        # concurrent callers are served in order without sleeping inside the lock
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class QuotaLedger:
+    # Local count of the daily requests quota.
+    # It is kept up to date with the "x-ratelimit-requests-*" headers returned with
+    # every API response, and only synced with the "status" endpoint on the first
+    # request, every "sync_interval" requests, and when the UTC day changes (the API
+    # resets the daily quota at 00:00 UTC)
+    def __init__(self, failsafe_threshold=20, sync_interval=50):
+        self.failsafe_threshold = int(failsafe_threshold)
+        self.sync_interval = int(sync_interval)
+        self.limit_day = None
+        self.remaining = None
+        self._requests_since_sync = 0
+        self._synced_day = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def needs_sync(self):
+        with self._lock:
+            return (
+                self.remaining is None
+                or self._synced_day != datetime.datetime.utcnow().date()
+                or self._requests_since_sync >= self.sync_interval
+            )
+
+    def sync_if_needed(self, get_limits):
+        # "get_limits" is only called by one thread at a time, so concurrent downloads
+        # starting together do not request the "status" endpoint once each
+        if not self.needs_sync():
+            return
+        with self._sync_lock:
+            if self.needs_sync():
+                self.sync(get_limits())
+
+    def sync(self, limits):
+        # "limits" is the dict returned by check_api_limits()
+        with self._lock:
+            self.limit_day = limits["limit_day"]
+            self.remaining = limits["remaining"]
+            self._requests_since_sync = 0
+            self._synced_day = datetime.datetime.utcnow().date()
+
+    def reserve(self, bypass_requests_limit_failsafe=False):
+        # Check there is quota left and count one request against it before it is made,
+        # so concurrent downloads can not overdraw the failsafe
+        with self._lock:
+            if not self.remaining or self.remaining <= 0:
+                raise Exception(
+                    f"Limit reached. No requests left for today. Daily limit is {self.limit_day} requests."
+                )
+            if (
+                self.remaining <= self.failsafe_threshold
+                and not bypass_requests_limit_failsafe
+            ):
+                # We avoid making requests if remaining requests for the day are under the
+                # failsafe threshold to leave room and avoid hitting the limit unadvertedly
+                raise Exception(
+                    f"Failsafe triggered. Only {self.failsafe_threshold} or less request left, so only manual downloads with 'bypass_requests_limit_failsafe=True' allowed"
+                )
+            self.remaining -= 1
+            self._requests_since_sync += 1
+
+    def update_from_headers(self, headers):
+        # API-Football reports the daily quota in every response headers
+        limit_day = headers.get("x-ratelimit-requests-limit")
+        remaining = headers.get("x-ratelimit-requests-remaining")
+        with self._lock:
+            if limit_day is not None:
+                self.limit_day = int(limit_day)
+            if remaining is not None:
+                # Responses of concurrent requests can arrive out of order, keep the lowest
+                remaining = int(remaining)
+                if self.remaining is None or remaining < self.remaining:
+                    self.remaining = remaining
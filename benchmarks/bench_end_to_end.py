@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# End to end benchmark of the downloader against the local fake API-Football
+# (fake_api_football.py), so no real daily quota is spent. Runs every
+# download_and_normalize_*() function and then
+# refresh_normalizations_using_latest_downloaded_data() over a temporary project folder
+# and reports, for every stage, the wall time, the API requests made (and their
+# throughput) and the peak memory (--trace-memory).
+#
+# The client rate limit is disabled by default (--client-requests-per-minute) to measure
+# the downloader itself. Use --latency, --server-requests-per-minute and --error-rate to
+# see how it behaves with a slow, rate limited or failing API.
+#
+# Usage: python benchmarks/bench_end_to_end.py [--teams 20] [--latency 0.02] [--workers 4]
+import argparse
+import contextlib
+import os
+import pathlib
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+
+import data_downloader  # noqa: E402
+from fake_api_football import FakeApiFootball, start_fake_api  # noqa: E402
+
+
+def get_max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux (bytes on macOS)
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_stage(name, function, fake_api, trace_memory, verbose):
+    requests_before = fake_api.stats["requests"]
+    if trace_memory:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    if verbose:
+        function()
+    else:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            function()
+    wall_time = time.perf_counter() - start
+    requests_count = fake_api.stats["requests"] - requests_before
+    result = {
+        "stage": name,
+        "wall_time": wall_time,
+        "requests": requests_count,
+        "requests_per_second": requests_count / wall_time if wall_time else 0,
+    }
+    if trace_memory:
+        result["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    return result
+
+
+def print_results(results, trace_memory):
+    header = f"{'stage':<32}{'wall time':>11}{'requests':>10}{'req/s':>9}"
+    if trace_memory:
+        header += f"{'peak MB':>9}"
+    print(header)
+    for result in results:
+        line = (
+            f"{result['stage']:<32}{result['wall_time']:>10.2f}s"
+            f"{result['requests']:>10}{result['requests_per_second']:>9.1f}"
+        )
+        if trace_memory:
+            line += f"{result['peak_memory_mb']:>9.1f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leagues", type=int, default=5)
+    parser.add_argument("--teams", type=int, default=20, help="Teams per league")
+    parser.add_argument("--players", type=int, default=30, help="Players per team")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--server-requests-per-minute", type=int, default=None)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--client-requests-per-minute", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=None, help="DOWNLOAD_WORKERS")
+    parser.add_argument(
+        "--verbose", action="store_true", help="Show the output of the downloader"
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Peak Python memory per stage with tracemalloc (slower)",
+    )
+    args = parser.parse_args()
+
+    fake_api = FakeApiFootball(
+        league_ids=[1 + i for i in range(args.leagues)],
+        teams_per_league=args.teams,
+        players_per_team=args.players,
+        latency=args.latency,
+        requests_per_minute=args.server_requests_per_minute,
+        error_rate=args.error_rate,
+    )
+    server = start_fake_api(fake_api)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # The module singletons are built with these settings when first used
+        settings = data_downloader.settings
+        settings.FOOTBALL_API_URL = f"http://127.0.0.1:{server.server_port}/"
+        settings.PROJECT_DIR = pathlib.Path(tmp_dir)
+        settings.ACTIVE_LEAGUES = fake_api.league_ids
+        settings.CURRENT_SEASON = fake_api.season
+        settings.FOOTBALL_API_KEY = "benchmark"
+        settings.REQUESTS_PER_MINUTE = args.client_requests_per_minute
+        settings.REQUESTS_BURST = args.client_requests_per_minute
+        if args.workers:
+            settings.DOWNLOAD_WORKERS = args.workers
+        # Only the summary is kept, not the metrics files
+        settings.RECORD_METRICS = False
+
+        team_ids = [
+            team_id
+            for league_id in fake_api.league_ids
+            for team_id in fake_api.get_team_ids(league_id)
+        ]
+
+        def download_events():
+            matches = data_downloader.get_normalized_matches()
+            match_ids = [
+                int(match_id)
+                for match_id, match in matches.items()
+                if match["status"] == "END"
+            ]
+            data_downloader.download_and_normalize_events_from_given_matches(match_ids)
+
+        stages = [
+            ("leagues", data_downloader.download_and_normalize_leagues_and_countries),
+            (
+                "fixtures",
+                data_downloader.download_and_normalize_all_matches_for_current_season_and_active_leagues,
+            ),
+            (
+                "squads",
+                lambda: data_downloader.download_and_normalize_squads_for_given_teams(
+                    team_ids
+                ),
+            ),
+            ("events", download_events),
+            (
+                "refresh",
+                data_downloader.refresh_normalizations_using_latest_downloaded_data,
+            ),
+            (
+                "refresh (incremental)",
+                lambda: data_downloader.refresh_normalizations_using_latest_downloaded_data(
+                    incremental=True
+                ),
+            ),
+        ]
+
+        if args.trace_memory:
+            tracemalloc.start()
+        results = []
+        start = time.perf_counter()
+        for name, function in stages:
+            results.append(
+                run_stage(name, function, fake_api, args.trace_memory, args.verbose)
+            )
+        total_time = time.perf_counter() - start
+        if args.trace_memory:
+            tracemalloc.stop()
+
+    server.shutdown()
+    print()
+    print_results(results, args.trace_memory)
+    total_requests = sum(result["requests"] for result in results)
+    print(
+        f"{'total':<32}{total_time:>10.2f}s{total_requests:>10}"
+        f"{total_requests / total_time:>9.1f}"
+    )
+    print(
+        f"API: {fake_api.stats['status_requests']} status requests, "
+        f"{fake_api.stats['rate_limited']} rate limited, {fake_api.stats['errors']} "
+        f"errors, {fake_api.stats['bytes'] / 1024 / 1024:.1f} MB served"
+    )
+    print(f"Peak RSS: {get_max_rss_mb():.1f} MB")
+    summary = data_downloader.get_run_metrics().get_summary()
+    print()
+    print(
+        f"{'endpoint':<32}{'latency':>10}{'retries':>9}{'backoff':>10}{'quota wait':>12}"
+    )
+    for endpoint, totals in summary["requests_by_endpoint"].items():
+        print(
+            f"{endpoint:<32}{totals['latency']:>9.2f}s{totals['retries']:>9}"
+            f"{totals['backoff_seconds']:>9.2f}s{totals['quota_wait_seconds']:>11.2f}s"
+        )
@@ -0,0 +1,397 @@
+#!/usr/bin/env python
+# Benchmark of the normalization of fixtures, squads and events (the hot loops of every
+# refresh), over synthetic raw data built with the fake API-Football
+# (fake_api_football.py):
+#     - Checks normalize_data() writes byte-identical normalized files to the legacy
+#       normalize_*() functions (a dict built with .update() and dumped at once with
+#       json.dumps(indent=2)). Some fixture dates are given other UTC offsets and
+#       formats, so the fallback of get_match_date() is covered too
+#     - Times the hot loop of normalize_data() (raw files parsed, records built and
+#       encoded) against the previous one (record iterators with per-call status tables
+#       and datetime parsing, and records encoded with json.dumps(indent=2))
+#
+# Then times the hot spots alone: the encoding of a record (dumps_record() against
+# json.dumps(), which has no C speedups with indent before Python 3.13) and the date of
+# a match (get_match_date() against datetime.fromisoformat()), and checks dumps_record()
+# gives the same text as json.dumps() for random values.
+#
+# Usage: python benchmarks/bench_normalizers.py [--leagues 20] [--repeat 3]
+import argparse
+import datetime
+import json
+import pathlib
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+
+import data_downloader  # noqa: E402
+from data_downloader import get_match_date  # noqa: E402
+from fake_api_football import FakeApiFootball  # noqa: E402
+from normalized_data import dumps_record  # noqa: E402
+from raw_storage import write_raw_data  # noqa: E402
+
+DATE_FOLDER = "20230115_120000Z"
+
+
+def legacy_normalize_matches(data_paths, dest_folder):
+    matches_info = {}
+    end_status = ["FT", "AET", "PEN"]
+    notend_status = ["TBD", "NS", "1H", "HT", "2H", "ET", "P", "BT", "PST", "LIVE"]
+    invalid_status = ["SUSP", "INT", "CANC", "ABD", "AWD", "WO", None]
+    api_football_status_translation = {}
+    api_football_status_translation.update(dict.fromkeys(end_status, "END"))
+    api_football_status_translation.update(dict.fromkeys(notend_status, "NOTEND"))
+    api_football_status_translation.update(dict.fromkeys(invalid_status, "INVALID"))
+    for file_path in data_paths:
+        with open(file_path, "r+") as f:
+            file_data = json.loads(f.read())
+            for match_data in file_data["response"]:
+                external_id = match_data["fixture"]["id"]
+                date = (
+                    datetime.datetime.fromisoformat(match_data["fixture"]["date"])
+                    .date()
+                    .isoformat()
+                )
+                matches_info.update(
+                    {
+                        external_id: {
+                            "date": date,
+                            "status": api_football_status_translation[
+                                match_data["fixture"]["status"]["short"]
+                            ],
+                            "home_team_external_id": match_data["teams"]["home"]["id"],
+                            "home_team_external_name": match_data["teams"]["home"][
+                                "name"
+                            ],
+                            "away_team_external_id": match_data["teams"]["away"]["id"],
+                            "away_team_external_name": match_data["teams"]["away"][
+                                "name"
+                            ],
+                            "league_id": match_data["league"]["id"],
+                        }
+                    }
+                )
+    with open(dest_folder / "matches_data.json", "w+") as matches_file:
+        matches_file.write(json.dumps(matches_info, indent=2))
+
+
+def legacy_normalize_squads(data_paths, dest_folder):
+    players_info = {}
+    for file_path in data_paths:
+        with open(file_path, "r+") as f:
+            file_data = json.loads(f.read())
+            for squad in file_data["response"]:
+                for player in squad["players"]:
+                    external_id = player["id"]
+                    players_info.update(
+                        {
+                            external_id: {
+                                "name": player["name"],
+                                "position": player["position"].lower(),
+                            }
+                        }
+                    )
+    with open(dest_folder / "players_data.json", "w+") as players_file:
+        players_file.write(json.dumps(players_info, indent=2))
+
+
+def legacy_normalize_events(data_paths, dest_folder):
+    events_info = {}
+    valid_goals_detail = ["normal goal", "own goal", "penalty"]
+    for file_path in data_paths:
+        with open(file_path, "r+") as f:
+            file_data = json.loads(f.read())
+            match_external_id = file_data["parameters"]["fixture"]
+            events_info.update({match_external_id: []})
+            for match_event in file_data["response"]:
+                if match_event["type"] == "Goal":
+                    event_detail = match_event["detail"].lower()
+                    if event_detail in valid_goals_detail:
+                        events_info[match_external_id].append(
+                            {
+                                "team": match_event["team"]["id"],
+                                "player_id": match_event["player"]["id"],
+                                "type": "goal",
+                                "detail": event_detail,
+                            }
+                        )
+    with open(dest_folder / "events_data.json", "w+") as events_file:
+        events_file.write(json.dumps(events_info, indent=2))
+
+
+def read_json(file_path):
+    with open(file_path, "r") as f:
+        return json.loads(f.read())
+
+
+def previous_iter_matches_records(data_paths):
+    end_status = ["FT", "AET", "PEN"]
+    notend_status = ["TBD", "NS", "1H", "HT", "2H", "ET", "P", "BT", "PST", "LIVE"]
+    invalid_status = ["SUSP", "INT", "CANC", "ABD", "AWD", "WO", None]
+    api_football_status_translation = {}
+    api_football_status_translation.update(dict.fromkeys(end_status, "END"))
+    api_football_status_translation.update(dict.fromkeys(notend_status, "NOTEND"))
+    api_football_status_translation.update(dict.fromkeys(invalid_status, "INVALID"))
+    for file_path in data_paths:
+        file_data = read_json(file_path)
+        for match_data in file_data["response"]:
+            external_id = match_data["fixture"]["id"]
+            date = (
+                datetime.datetime.fromisoformat(match_data["fixture"]["date"])
+                .date()
+                .isoformat()
+            )
+            yield external_id, {
+                "date": date,
+                "status": api_football_status_translation[
+                    match_data["fixture"]["status"]["short"]
+                ],
+                "home_team_external_id": match_data["teams"]["home"]["id"],
+                "home_team_external_name": match_data["teams"]["home"]["name"],
+                "away_team_external_id": match_data["teams"]["away"]["id"],
+                "away_team_external_name": match_data["teams"]["away"]["name"],
+                "league_id": match_data["league"]["id"],
+            }
+
+
+def previous_iter_players_records(data_paths):
+    for file_path in data_paths:
+        file_data = read_json(file_path)
+        for squad in file_data["response"]:
+            for player in squad["players"]:
+                external_id = player["id"]
+                yield external_id, {
+                    "name": player["name"],
+                    "position": player["position"].lower(),
+                }
+
+
+def previous_iter_events_records(data_paths):
+    valid_goals_detail = ["normal goal", "own goal", "penalty"]
+    for file_path in data_paths:
+        file_data = read_json(file_path)
+        match_external_id = file_data["parameters"]["fixture"]
+        match_events = []
+        for match_event in file_data["response"]:
+            if match_event["type"] == "Goal":
+                event_detail = match_event["detail"].lower()
+                if event_detail in valid_goals_detail:
+                    match_events.append(
+                        {
+                            "team": match_event["team"]["id"],
+                            "player_id": match_event["player"]["id"],
+                            "type": "goal",
+                            "detail": event_detail,
+                        }
+                    )
+        yield match_external_id, match_events
+
+
+def previous_encode_records(path_id, data_paths):
+    # Hot loop of normalize_data() before: records encoded with json.dumps(indent=2)
+    iter_records = {
+        "fixtures": previous_iter_matches_records,
+        "fixtures/events": previous_iter_events_records,
+        "players/squads": previous_iter_players_records,
+    }[path_id]
+    for external_id, data in iter_records(data_paths):
+        json.dumps({external_id: data}, indent=2)[2:-2].encode()
+
+
+def current_encode_records(path_id, data_paths):
+    for _, external_id, data in data_downloader.iter_normalized_records(
+        path_id, data_paths
+    ):
+        dumps_record(external_id, data).encode()
+
+
+# (path identifier, legacy function, normalized file)
+NORMALIZERS = [
+    ("fixtures", legacy_normalize_matches, "matches_data.json"),
+    ("players/squads", legacy_normalize_squads, "players_data.json"),
+    ("fixtures/events", legacy_normalize_events, "events_data.json"),
+]
+
+
+def build_raw_data(raw_data_path, fake_api):
+    # Returns {path_id: [raw data paths]}, written like download() does
+    data_paths = {path_id: [] for path_id, _, _ in NORMALIZERS}
+
+    def write(path_id, params, items):
+        _, file_name = data_downloader.build_get_string_and_file_name(params)
+        path = raw_data_path / path_id / DATE_FOLDER / f"{file_name}__p1.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "get": path_id,
+            "parameters": params,
+            "errors": [],
+            "results": len(items),
+            "paging": {"current": 1, "total": 1},
+            "response": items,
+        }
+        write_raw_data(path, data)
+        data_paths[path_id].append(path)
+
+    # Real dates come with the offset of the requested timezone, and could come in
+    # other ISO formats
+    date_formats = [
+        lambda date: f"{date}T19:00:00+00:00",
+        lambda date: f"{date}T23:30:00-03:00",
+        lambda date: f"{date}T00:15:00+02:00",
+        lambda date: f"{date} 19:00:00",
+        lambda date: f"{date}T19:00:00",
+    ]
+    date_random = random.Random(0)
+    fixture_ids = []
+    for league_id in fake_api.league_ids:
+        fixtures = json.loads(json.dumps(fake_api.get_league_fixtures(league_id)))
+        for fixture in fixtures:
+            date = fixture["fixture"]["date"][:10]
+            fixture["fixture"]["date"] = date_random.choice(date_formats)(date)
+            if fixture["fixture"]["status"]["short"] == "FT":
+                fixture_ids.append(fixture["fixture"]["id"])
+        params = {"league": str(league_id), "season": str(fake_api.season)}
+        write("fixtures", params, fixtures)
+        for team_id in fake_api.get_team_ids(league_id):
+            write("players/squads", {"team": str(team_id)}, fake_api.get_squad(team_id))
+    for fixture_id in fixture_ids:
+        params = {"fixture": str(fixture_id)}
+        write("fixtures/events", params, fake_api.get_fixture_events(fixture_id))
+    return data_paths
+
+
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def random_value(value_random, depth=0):
+    kind = value_random.randint(0, 7 if depth < 4 else 3)
+    if kind == 0:
+        return value_random.choice(["", 'Team "B"', "Müller", "é\n\t", "x" * 9])
+    if kind == 1:
+        return value_random.randint(-(10**20), 10**20)
+    if kind == 2:
+        return value_random.choice([0.0, -0.0, 1e16, 1.5, value_random.random()])
+    if kind == 3:
+        return value_random.choice([None, True, False])
+    if kind <= 5:
+        items_count = value_random.randint(0, 3)
+        return [random_value(value_random, depth + 1) for _ in range(items_count)]
+    keys = ["a", "ñ", str(value_random.random()), value_random.randint(0, 9)]
+    return {
+        value_random.choice(keys): random_value(value_random, depth + 1)
+        for _ in range(value_random.randint(0, 4))
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leagues", type=int, default=20)
+    parser.add_argument("--teams", type=int, default=20, help="Teams per league")
+    parser.add_argument("--players", type=int, default=30, help="Players per team")
+    parser.add_argument("--repeat", type=int, default=3, help="Best time of N runs")
+    args = parser.parse_args()
+
+    fake_api = FakeApiFootball(
+        league_ids=[1 + i for i in range(args.leagues)],
+        teams_per_league=args.teams,
+        players_per_team=args.players,
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_path = pathlib.Path(tmp_dir)
+        print("Building synthetic raw data...")
+        data_paths = build_raw_data(tmp_path / "raw_data", fake_api)
+        legacy_folder = tmp_path / "legacy" / "newest_data"
+        legacy_folder.mkdir(parents=True)
+
+        settings = data_downloader.settings
+        settings.PROJECT_DIR = tmp_path / "current"
+        settings.EXPORT_SQLITE = False
+        settings.RECORD_METRICS = False
+
+        for path_id, legacy_function, normalized_file_name in NORMALIZERS:
+            paths = data_paths[path_id]
+            legacy_function(paths, legacy_folder)
+            data_downloader.normalize_data(path_id, paths)
+            legacy_bytes = (legacy_folder / normalized_file_name).read_bytes()
+            current_bytes = (
+                settings.PROJECT_DIR / "newest_data" / normalized_file_name
+            ).read_bytes()
+            assert legacy_bytes == current_bytes, f"{normalized_file_name} differs"
+        print("Normalized files are byte-identical to the legacy normalizers")
+
+        # Raw files parsed, records built and encoded, without the writers
+        print(
+            f"{'normalizer':<20}{'files':>7}{'previous':>10}{'current':>10}"
+            f"{'speedup':>9}"
+        )
+        for path_id, _, _ in NORMALIZERS:
+            paths = data_paths[path_id]
+            previous_time = best_time(
+                lambda: previous_encode_records(path_id, paths), args.repeat
+            )
+            current_time = best_time(
+                lambda: current_encode_records(path_id, paths), args.repeat
+            )
+            print(
+                f"{path_id:<20}{len(paths):>7}{previous_time:>9.3f}s"
+                f"{current_time:>9.3f}s{previous_time / current_time:>8.1f}x"
+            )
+
+        # Hot spots alone
+        records = json.loads(
+            (settings.PROJECT_DIR / "newest_data" / "matches_data.json").read_text()
+        )
+        records = list(records.items())
+        json_time = best_time(
+            lambda: [json.dumps({k: v}, indent=2)[2:-2] for k, v in records],
+            args.repeat,
+        )
+        record_time = best_time(
+            lambda: [dumps_record(k, v) for k, v in records], args.repeat
+        )
+        print(
+            f"Encoding {len(records)} matches: json.dumps {json_time:.3f}s, "
+            f"dumps_record {record_time:.3f}s ({json_time / record_time:.1f}x)"
+        )
+        dates = [
+            fixture["fixture"]["date"]
+            for path in data_paths["fixtures"]
+            for fixture in json.loads(path.read_text())["response"]
+        ]
+        parsed_dates = [
+            datetime.datetime.fromisoformat(date).date().isoformat() for date in dates
+        ]
+        assert [get_match_date(date) for date in dates] == parsed_dates
+        fromisoformat_time = best_time(
+            lambda: [
+                datetime.datetime.fromisoformat(date).date().isoformat()
+                for date in dates
+            ],
+            args.repeat,
+        )
+        date_time = best_time(
+            lambda: [get_match_date(date) for date in dates], args.repeat
+        )
+        print(
+            f"Dates of {len(dates)} matches: fromisoformat {fromisoformat_time:.3f}s, "
+            f"get_match_date {date_time:.3f}s ({fromisoformat_time / date_time:.1f}x)"
+        )
+
+    value_random = random.Random(0)
+    for _ in range(10000):
+        key = value_random.choice(["1", 1, "é"])
+        value = random_value(value_random)
+        expected = json.dumps({key: value}, indent=2)[2:-2]
+        assert dumps_record(key, value) == expected, (key, value)
+    print("dumps_record matches json.dumps for 10000 random values")
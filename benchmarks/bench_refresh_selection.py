@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# Benchmark of the selection of the latest downloaded files done by
+# refresh_normalizations_using_latest_downloaded_data(), over a synthetic raw_data tree.
+# Compares select_latest_data_paths() with the previous implementation (deep_dict_merge
+# of the whole accumulated dict for every file), which is quadratic, so it is only run
+# over the first --legacy-files files and its time for the full tree is extrapolated from
+# the number of entries it would copy.
+#
+# Usage: python benchmarks/bench_refresh_selection.py [--files 100000] [--legacy-files 2000]
+import argparse
+from copy import deepcopy
+import datetime
+import pathlib
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from data_downloader import get_path_identifier, select_latest_data_paths  # noqa: E402
+
+
+def deep_dict_merge(a: dict, b: dict) -> dict:
+    result = deepcopy(a)
+    for bk, bv in b.items():
+        av = result.get(bk)
+        if isinstance(av, dict) and isinstance(bv, dict):
+            result[bk] = deep_dict_merge(av, bv)
+        else:
+            result[bk] = deepcopy(bv)
+    return result
+
+
+def legacy_select_latest_data_paths(all_paths):
+    filtered_paths = {}
+    for item in all_paths:
+        absolute_path = item.absolute()
+        path_id = get_path_identifier(absolute_path)
+        if absolute_path.name.endswith(".json"):
+            current_folder_date = datetime.datetime.strptime(
+                absolute_path.parts[-2], "%Y%m%d_%H%M%SZ"
+            )
+            current_file_name = absolute_path.parts[-1]
+            previous_file = filtered_paths.get(path_id, {}).get(current_file_name)
+            if previous_file:
+                previous_file_date = datetime.datetime.strptime(
+                    previous_file.parts[-2], "%Y%m%d_%H%M%SZ"
+                )
+                if current_folder_date > previous_file_date:
+                    filtered_paths = deep_dict_merge(
+                        filtered_paths, {path_id: {current_file_name: absolute_path}}
+                    )
+            else:
+                filtered_paths = deep_dict_merge(
+                    filtered_paths, {path_id: {current_file_name: absolute_path}}
+                )
+    return filtered_paths
+
+
+def build_raw_data_tree(raw_data_path, files_count):
+    # Spread files like a real season does: every run (date folder) downloads squads and
+    # events for a few hundred teams and matches, so the same file names repeat
+    endpoints = ["players/squads", "fixtures/events", "fixtures", "leagues"]
+    files_per_folder = 500
+    start = datetime.datetime(2022, 8, 1)
+    paths = []
+    folder_num = 0
+    while len(paths) < files_count:
+        endpoint = endpoints[folder_num % 2] if folder_num % 20 else endpoints[2]
+        folder_name = (start + datetime.timedelta(hours=folder_num)).strftime(
+            "%Y%m%d_%H%M%SZ"
+        )
+        folder = raw_data_path / endpoint / folder_name
+        folder.mkdir(parents=True)
+        param = {"players/squads": "team", "fixtures/events": "fixture"}.get(
+            endpoint, "league"
+        )
+        offset = (folder_num * 137) % 2000
+        for i in range(min(files_per_folder, files_count - len(paths))):
+            path = folder / f"{param}_{offset + i}__p1.json"
+            path.touch()
+            paths.append(path)
+        folder_num += 1
+    return paths
+
+
+def count_copied_entries(paths):
+    # Number of entries deep_dict_merge() copies to select the latest of the given paths:
+    # the whole accumulated dict, each time a new or newer file is found
+    latest = {}
+    copied = 0
+    for path in paths:
+        key = (path.parent.parent, path.name)
+        if key not in latest or path.parent.name > latest[key]:
+            copied += len(latest)
+            latest[key] = path.parent.name
+    return copied
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--legacy-files", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        raw_data_path = pathlib.Path(tmp_dir) / "raw_data"
+        print(f"Building synthetic raw_data tree with {args.files} files...")
+        paths = build_raw_data_tree(raw_data_path, args.files)
+
+        result, new_time = timed(select_latest_data_paths, paths)
+        selected = sum(len(v) for v in result.values())
+        print(
+            f"select_latest_data_paths: {len(paths)} files -> {selected} latest in {new_time:.3f}s"
+        )
+
+        legacy_paths = paths[: args.legacy_files]
+        legacy_result, legacy_time = timed(
+            legacy_select_latest_data_paths, legacy_paths
+        )
+        subset_result, subset_time = timed(select_latest_data_paths, legacy_paths)
+        assert (
+            legacy_result == subset_result
+        ), "Implementations selected different files"
+        print(
+            f"legacy implementation: {len(legacy_paths)} files in {legacy_time:.3f}s "
+            f"(select_latest_data_paths: {subset_time:.3f}s, same selection)"
+        )
+
+        # The legacy implementation time grows with the entries it copies
+        extrapolated = (
+            legacy_time
+            * count_copied_entries(paths)
+            / count_copied_entries(legacy_paths)
+        )
+        print(
+            f"legacy implementation extrapolated to {args.files} files: ~{extrapolated:.0f}s "
+            f"(~{extrapolated / new_time:.0f}x slower)"
+        )
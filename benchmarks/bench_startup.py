@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# Benchmark of the startup of a short run (e.g.: a single job or a worker process): how
+# long a new Python process takes to import data_downloader and to reach (and finish)
+# its first download() call, against the local fake API-Football (fake_api_football.py).
+# Every run is a new process started from a temporary folder, so nothing is cached and
+# nothing depends on the current directory. Reports the median of --runs runs of:
+#     - interpreter: starting Python itself (python -c pass)
+#     - import: importing data_downloader
+#     - first download() call: from the start of the process until download() is called
+#     - first download() done: until the first download() returns (the first request
+#       builds the API client and syncs the quota with the "status" endpoint)
+#
+# Usage: python benchmarks/bench_startup.py [--runs 10] [--importtime]
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent))
+
+from fake_api_football import FakeApiFootball, start_fake_api  # noqa: E402
+
+PROJECT_DIR = pathlib.Path(__file__).resolve().parent.parent
+
+# Run in the new process, with the fake API URL and a project folder as arguments
+CHILD_SCRIPT = """
+import time
+start = time.perf_counter()
+import pathlib
+import json
+import sys
+import data_downloader
+imported = time.perf_counter()
+settings = data_downloader.settings
+settings.FOOTBALL_API_URL = sys.argv[1]
+settings.FOOTBALL_API_KEY = "benchmark"
+settings.PROJECT_DIR = pathlib.Path(sys.argv[2])
+settings.RECORD_METRICS = False
+download_called = time.perf_counter()
+data_downloader.download("leagues", force=True)
+download_done = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "download_called": download_called - start,
+    "download_done": download_done - start,
+}))
+"""
+
+
+def run_child(args, cwd):
+    env = dict(os.environ, PYTHONPATH=str(PROJECT_DIR))
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *args],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result, time.perf_counter() - start
+
+
+def print_slowest_imports(cwd, count=15):
+    # Cumulative import time of the slowest modules imported by data_downloader
+    result, _ = run_child(["-X", "importtime", "-c", "import data_downloader"], cwd)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:") :].split("|")
+        imports.append((int(cumulative), module.strip()))
+    print("Slowest imports of data_downloader (cumulative):")
+    for cumulative, module in sorted(imports, reverse=True)[:count]:
+        print(f"{cumulative / 1000:>10.1f}ms  {module}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--importtime",
+        action="store_true",
+        help="Also show the slowest imports (python -X importtime)",
+    )
+    args = parser.parse_args()
+
+    fake_api = FakeApiFootball()
+    server = start_fake_api(fake_api)
+    url = f"http://127.0.0.1:{server.server_port}/"
+
+    timings = {
+        "interpreter": [],
+        "import": [],
+        "download_called": [],
+        "download_done": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for run_num in range(args.runs):
+            _, interpreter_time = run_child(["-c", "pass"], tmp_dir)
+            timings["interpreter"].append(interpreter_time)
+            project_dir = pathlib.Path(tmp_dir) / f"run_{run_num}"
+            result, _ = run_child(["-c", CHILD_SCRIPT, url, str(project_dir)], tmp_dir)
+            for key, value in json.loads(result.stdout.splitlines()[-1]).items():
+                timings[key].append(value)
+        if args.importtime:
+            print_slowest_imports(tmp_dir)
+            print()
+    server.shutdown()
+
+    labels = {
+        "interpreter": "interpreter",
+        "import": "import data_downloader",
+        "download_called": "first download() call",
+        "download_done": "first download() done",
+    }
+    print(f"Median of {args.runs} runs (Python {sys.version.split()[0]}):")
+    for key, label in labels.items():
+        print(f"{label:<28}{statistics.median(timings[key]) * 1000:>9.1f}ms")
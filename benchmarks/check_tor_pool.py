@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# Check of TorPool (tor_utils.py) without tor: the pool is built with a local stub of
+# the tor instances, whose requests just take --request-time seconds. It checks that:
+#     - round_robin sends every request through the next instance
+#     - least_busy sends concurrent requests through different instances
+#     - renew() waits for the requests in flight of the instance, while new requests go
+#       through the rest of instances
+#     - with rotation_interval, every instance is renewed in the background, one at a
+#       time, until the pool is closed
+# It fails with an AssertionError at the first check that does not pass.
+#
+# Usage: python benchmarks/check_tor_pool.py [--request-time 0.2]
+import argparse
+import pathlib
+import sys
+import threading
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from tor_utils import TorPool  # noqa: E402
+
+
+class StubSession:
+    def __init__(self, tor, request_time):
+        self.tor = tor
+        self.request_time = request_time
+
+    def get(self, url, **kwargs):
+        with self.tor.lock:
+            assert not self.tor.renewing, "Request sent while renewing"
+            self.tor.in_flight += 1
+            self.tor.max_in_flight = max(self.tor.max_in_flight, self.tor.in_flight)
+        time.sleep(self.request_time)
+        with self.tor.lock:
+            self.tor.in_flight -= 1
+            self.tor.requests += 1
+        return self.tor.socks_port
+
+
+class StubTor:
+    # Same interface as tor_utils.Tor: socks_port, session and renew_connection()
+    def __init__(self, socks_port, exit_nodes=None, request_time=0.2):
+        self.socks_port = socks_port
+        self.request_time = request_time
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+        self.renewing = False
+        self.renewals = 0
+        self.session = StubSession(self, request_time)
+
+    def renew_connection(self):
+        with self.lock:
+            assert not self.in_flight, "Renewed with requests in flight"
+            self.renewing = True
+        time.sleep(self.request_time)
+        with self.lock:
+            self.renewing = False
+            self.renewals += 1
+
+
+def build_pool(request_time, ports=(9050, 9051, 9052), **kwargs):
+    def tor_factory(socks_port, exit_nodes):
+        return StubTor(socks_port, exit_nodes, request_time)
+
+    return TorPool(list(ports), tor_factory=tor_factory, **kwargs)
+
+
+def get_concurrently(tor_pool, count):
+    # Ports every request went through, in the order the requests were sent
+    ports = [None] * count
+
+    def get(num):
+        ports[num] = tor_pool.get("http://example.com")
+
+    threads = [threading.Thread(target=get, args=(num,)) for num in range(count)]
+    for thread in threads:
+        thread.start()
+        # So the order the requests are sent in is known
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+    return ports
+
+
+def check_round_robin(request_time):
+    with build_pool(request_time, strategy=TorPool.ROUND_ROBIN) as tor_pool:
+        ports = [tor_pool.get("http://example.com") for _ in range(6)]
+    assert ports == [9050, 9051, 9052] * 2, ports
+    print(f"round_robin: sequential requests went through {ports}")
+
+
+def check_least_busy(request_time):
+    with build_pool(request_time) as tor_pool:
+        ports = get_concurrently(tor_pool, 3)
+        assert sorted(ports) == [9050, 9051, 9052], ports
+        assert all(tor.max_in_flight == 1 for tor in tor_pool.instances)
+        # Without requests in flight, the first instance is the least busy one
+        sequential_ports = [tor_pool.get("http://example.com") for _ in range(3)]
+        assert sequential_ports == [9050] * 3, sequential_ports
+    print(f"least_busy: concurrent requests went through {ports}")
+
+
+def check_renew_waits_for_requests(request_time):
+    with build_pool(request_time, ports=(9050, 9051)) as tor_pool:
+        first_tor = tor_pool.instances[0]
+        request = threading.Thread(target=tor_pool.get, args=("http://example.com",))
+        request.start()
+        time.sleep(request_time / 4)
+        assert first_tor.in_flight == 1
+
+        start = time.perf_counter()
+        renewal = threading.Thread(target=tor_pool.renew, args=(0,))
+        renewal.start()
+        time.sleep(request_time / 4)
+        # Still waiting for the request in flight, and new requests skip the instance
+        assert not first_tor.renewals and not first_tor.renewing
+        ports = [tor_pool.get("http://example.com") for _ in range(2)]
+        assert ports == [9051, 9051], ports
+        request.join()
+        renewal.join()
+        elapsed = time.perf_counter() - start
+        assert first_tor.renewals == 1
+        assert first_tor.requests == 1
+    print(
+        f"renew: waited for the request in flight ({elapsed:.2f}s), "
+        f"meanwhile requests went through {ports}"
+    )
+
+
+def check_rotation(request_time):
+    # Every instance renewed once per rotation_interval, one at a time
+    rotation_interval = request_time * 6
+    with build_pool(request_time, rotation_interval=rotation_interval) as tor_pool:
+        requests_sent = 0
+        end = time.perf_counter() + rotation_interval * 1.5
+        while time.perf_counter() < end:
+            get_concurrently(tor_pool, 2)
+            requests_sent += 2
+            renewing = [tor.socks_port for tor in tor_pool.instances if tor.renewing]
+            assert len(renewing) <= 1, renewing
+    renewals = [tor.renewals for tor in tor_pool.instances]
+    assert all(renewals), renewals
+    time.sleep(rotation_interval)
+    # Closing the pool stops the rotation
+    assert [tor.renewals for tor in tor_pool.instances] == renewals
+    print(
+        f"rotation: renewals per instance {renewals} in "
+        f"{rotation_interval * 1.5:.2f}s, {requests_sent} requests sent meanwhile"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--request-time",
+        type=float,
+        default=0.2,
+        help="Seconds every request (and renewal) of the stub tor instances takes",
+    )
+    args = parser.parse_args()
+
+    check_round_robin(args.request_time)
+    check_least_busy(args.request_time)
+    check_renew_waits_for_requests(args.request_time)
+    check_rotation(args.request_time)
+    print("TorPool checks passed")
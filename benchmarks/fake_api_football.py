@@ -0,0 +1,399 @@
+#!/usr/bin/env python
+# Local stand-in of v3.football.api-sports.io, to measure the downloader without
+# spending real daily quota. Serves synthetic (but deterministic) "leagues", "fixtures",
+# "players/squads", "fixtures/events" and "status" responses, shaped like the real ones.
+# Like the real API, those endpoints have a single page, unless they are listed in
+# paginated_endpoints: then they are paginated by "page" with up to page_size items.
+# Latency, per minute and daily limits and errors can be configured:
+#     - latency: seconds every response is delayed
+#     - requests_per_minute: like API-Football, requests over the limit get a 200 with a
+#       "rateLimit" error
+#     - daily_limit: requests over the limit get a 200 with a "requests" error
+#     - error_rate: fraction of the requests answered with a 503 (or a 500)
+#
+# Usage: python benchmarks/fake_api_football.py [--port 8090] [--latency 0.05]
+# and set FOOTBALL_API_URL=http://127.0.0.1:8090/ to use it
+import argparse
+import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+
+class FakeApiFootball:
+    # Data and limits of the fake API. Every league has teams_per_league teams, with
+    # players_per_team players each, that play each other twice (one match per team and
+    # week). Matches before "today" are finished and have events
+    def __init__(
+        self,
+        league_ids=(2, 3, 39, 140, 435),
+        teams_per_league=20,
+        players_per_team=30,
+        paginated_endpoints=(),
+        page_size=20,
+        latency=0.0,
+        requests_per_minute=None,
+        daily_limit=1_000_000,
+        error_rate=0.0,
+        season=2022,
+        today=datetime.date(2023, 1, 15),
+        seed=0,
+    ):
+        self.league_ids = list(league_ids)
+        self.teams_per_league = teams_per_league
+        self.players_per_team = players_per_team
+        self.paginated_endpoints = set(paginated_endpoints)
+        self.page_size = page_size
+        self.latency = latency
+        self.requests_per_minute = requests_per_minute
+        self.daily_limit = daily_limit
+        self.error_rate = error_rate
+        self.season = season
+        self.today = today
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._minute_requests = []
+        self._fixtures = {}
+        # Requests that count towards the daily limit
+        self.used_requests = 0
+        self.stats = {
+            "requests": 0,
+            "status_requests": 0,
+            "rate_limited": 0,
+            "errors": 0,
+            "bytes": 0,
+        }
+
+    # ### DATA ### #
+
+    def get_team_ids(self, league_id):
+        return [league_id * 1000 + i for i in range(1, self.teams_per_league + 1)]
+
+    def get_league_fixtures(self, league_id):
+        if league_id not in self._fixtures:
+            self._fixtures[league_id] = self._build_league_fixtures(league_id)
+        return self._fixtures[league_id]
+
+    def _build_league_fixtures(self, league_id):
+        # Double round robin (circle method), one round per week from August
+        team_ids = self.get_team_ids(league_id)
+        if len(team_ids) % 2:
+            team_ids.append(None)
+        rounds = []
+        teams = list(team_ids)
+        for _ in range(len(teams) - 1):
+            half = len(teams) // 2
+            rounds.append(list(zip(teams[:half], reversed(teams[half:]))))
+            teams = [teams[0], teams[-1]] + teams[1:-1]
+        rounds += [[(away, home) for home, away in pairs] for pairs in rounds]
+
+        first_day = datetime.date(self.season, 8, 13)
+        fixtures = []
+        for round_num, pairs in enumerate(rounds):
+            date = first_day + datetime.timedelta(weeks=round_num)
+            for match_num, (home, away) in enumerate(pairs):
+                if home is None or away is None:
+                    continue
+                fixture_id = league_id * 100000 + round_num * 100 + match_num
+                fixtures.append(
+                    self._build_fixture(fixture_id, league_id, date, home, away)
+                )
+        return fixtures
+
+    def _build_fixture(self, fixture_id, league_id, date, home, away):
+        status = "FT" if date < self.today else "NS"
+        return {
+            "fixture": {
+                "id": fixture_id,
+                "referee": None,
+                "timezone": "UTC",
+                "date": f"{date.isoformat()}T19:00:00+00:00",
+                "timestamp": int(
+                    datetime.datetime.combine(date, datetime.time(19)).timestamp()
+                ),
+                "venue": {"id": home, "name": f"Stadium {home}", "city": None},
+                "status": {
+                    "long": "Match Finished" if status == "FT" else "Not Started",
+                    "short": status,
+                    "elapsed": 90 if status == "FT" else None,
+                },
+            },
+            "league": {
+                "id": league_id,
+                "name": f"League {league_id}",
+                "country": "Spain",
+                "season": self.season,
+            },
+            "teams": {
+                "home": {"id": home, "name": f"Team {home}", "winner": None},
+                "away": {"id": away, "name": f"Team {away}", "winner": None},
+            },
+            "goals": {"home": None, "away": None},
+        }
+
+    def get_fixture_events(self, fixture_id):
+        league_id = fixture_id // 100000
+        if league_id not in self.league_ids:
+            return []
+        fixture = next(
+            (
+                f
+                for f in self.get_league_fixtures(league_id)
+                if f["fixture"]["id"] == fixture_id
+            ),
+            None,
+        )
+        if fixture is None or fixture["fixture"]["status"]["short"] != "FT":
+            return []
+        match_random = random.Random(fixture_id)
+        events = []
+        for minute in sorted(match_random.sample(range(1, 91), 8)):
+            side = match_random.choice(["home", "away"])
+            team_id = fixture["teams"][side]["id"]
+            player_id = team_id * 100 + match_random.randint(1, self.players_per_team)
+            event_type, detail = match_random.choice(
+                [
+                    ("Goal", "Normal Goal"),
+                    ("Goal", "Penalty"),
+                    ("Goal", "Own Goal"),
+                    ("Goal", "Missed Penalty"),
+                    ("Card", "Yellow Card"),
+                    ("subst", "Substitution 1"),
+                ]
+            )
+            events.append(
+                {
+                    "time": {"elapsed": minute, "extra": None},
+                    "team": {"id": team_id, "name": f"Team {team_id}"},
+                    "player": {"id": player_id, "name": f"Player {player_id}"},
+                    "assist": {"id": None, "name": None},
+                    "type": event_type,
+                    "detail": detail,
+                    "comments": None,
+                }
+            )
+        return events
+
+    def get_squad(self, team_id):
+        positions = ["Goalkeeper", "Defender", "Midfielder", "Attacker"]
+        return [
+            {
+                "team": {"id": team_id, "name": f"Team {team_id}"},
+                "players": [
+                    {
+                        "id": team_id * 100 + i,
+                        "name": f"Player {team_id * 100 + i}",
+                        "age": 20 + i % 15,
+                        "number": i,
+                        "position": positions[i % len(positions)],
+                    }
+                    for i in range(1, self.players_per_team + 1)
+                ],
+            }
+        ]
+
+    def get_leagues(self):
+        countries = [("Spain", "ES"), ("England", "GB"), ("World", None)]
+        return [
+            {
+                "league": {
+                    "id": league_id,
+                    "name": f"League {league_id}",
+                    "type": "League",
+                },
+                "country": dict(zip(["name", "code"], countries[i % len(countries)])),
+                "seasons": [{"year": self.season, "current": True}],
+            }
+            for i, league_id in enumerate(self.league_ids)
+        ]
+
+    def get_items(self, endpoint, params):
+        # Returns the full (not paginated) response of an endpoint, or None if unknown
+        try:
+            if endpoint == "leagues":
+                return self.get_leagues()
+            if endpoint == "fixtures":
+                league_id = int(params["league"])
+                if league_id not in self.league_ids:
+                    return []
+                return self.get_league_fixtures(league_id)
+            if endpoint == "fixtures/events":
+                return self.get_fixture_events(int(params["fixture"]))
+            if endpoint == "players/squads":
+                return self.get_squad(int(params["team"]))
+        except (KeyError, ValueError):
+            return []
+        return None
+
+    # ### LIMITS ### #
+
+    def check_limits(self):
+        # Returns an error response (status, body) if the request is refused, else None
+        with self._lock:
+            self.stats["requests"] += 1
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return self._random.choice([500, 503]), {"message": "Server error"}
+            now = time.monotonic()
+            if self.requests_per_minute:
+                self._minute_requests = [
+                    t for t in self._minute_requests if now - t < 60
+                ]
+                if len(self._minute_requests) >= self.requests_per_minute:
+                    self.stats["rate_limited"] += 1
+                    return 200, {
+                        "errors": {
+                            "rateLimit": "Too many requests. Your rate limit is "
+                            f"{self.requests_per_minute} requests per minute."
+                        },
+                        "response": [],
+                    }
+                self._minute_requests.append(now)
+            if self.used_requests >= self.daily_limit:
+                self.stats["rate_limited"] += 1
+                return 200, {
+                    "errors": {
+                        "requests": "You have reached the request limit for the day"
+                    },
+                    "response": [],
+                }
+            self.used_requests += 1
+        return None
+
+    def get_rate_limit_headers(self):
+        headers = {
+            "x-ratelimit-requests-limit": str(self.daily_limit),
+            "x-ratelimit-requests-remaining": str(
+                max(0, self.daily_limit - self.used_requests)
+            ),
+        }
+        if self.requests_per_minute:
+            headers["X-RateLimit-Limit"] = str(self.requests_per_minute)
+            headers["X-RateLimit-Remaining"] = str(
+                max(0, self.requests_per_minute - len(self._minute_requests))
+            )
+        return headers
+
+    # ### REQUESTS ### #
+
+    def handle(self, path):
+        # Returns (status, headers, body)
+        url = urllib.parse.urlsplit(path)
+        endpoint = url.path.strip("/")
+        params = dict(urllib.parse.parse_qsl(url.query))
+        if self.latency:
+            time.sleep(self.latency)
+
+        if endpoint == "status":
+            # Does not count towards any limit
+            with self._lock:
+                self.stats["status_requests"] += 1
+            body = {
+                "get": "status",
+                "parameters": [],
+                "errors": [],
+                "results": 1,
+                "response": {
+                    "account": {"firstname": "Fake", "lastname": "Api"},
+                    "requests": {
+                        "current": self.used_requests,
+                        "limit_day": self.daily_limit,
+                    },
+                },
+            }
+            return 200, self.get_rate_limit_headers(), body
+
+        error = self.check_limits()
+        if error:
+            status, body = error
+            headers = self.get_rate_limit_headers()
+            if status != 200:
+                headers["Retry-After"] = "0"
+            body.setdefault("get", endpoint)
+            body.setdefault("parameters", params)
+            return status, headers, body
+
+        items = self.get_items(endpoint, params)
+        if items is None:
+            return 404, {}, {"message": "Endpoint not found"}
+        page, total_pages, page_items = 1, 1, items
+        if endpoint in self.paginated_endpoints:
+            try:
+                page = max(1, int(params.get("page", 1)))
+            except ValueError:
+                pass
+            total_pages = max(1, -(-len(items) // self.page_size))
+            page_items = items[(page - 1) * self.page_size : page * self.page_size]
+        body = {
+            "get": endpoint,
+            "parameters": params,
+            "errors": [],
+            "results": len(page_items),
+            "paging": {"current": page, "total": total_pages},
+            "response": page_items,
+        }
+        return 200, self.get_rate_limit_headers(), body
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    api = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        status, headers, body = self.api.handle(self.path)
+        data = json.dumps(body).encode()
+        with self.api._lock:
+            self.api.stats["bytes"] += len(data)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_fake_api(api, port=0):
+    # Serves the fake api in a background thread. Returns the server, its URL is
+    # f"http://127.0.0.1:{server.server_port}/" (call server.shutdown() to stop it)
+    handler_class = type("Handler", (FakeApiHandler,), {"api": api})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler_class)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in of API-Football")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--requests-per-minute", type=int, default=None)
+    parser.add_argument("--daily-limit", type=int, default=1_000_000)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--paginated-endpoint", action="append", default=[], dest="paginated_endpoints"
+    )
+    parser.add_argument("--page-size", type=int, default=20)
+    args = parser.parse_args()
+
+    fake_api = FakeApiFootball(
+        paginated_endpoints=args.paginated_endpoints,
+        page_size=args.page_size,
+        latency=args.latency,
+        requests_per_minute=args.requests_per_minute,
+        daily_limit=args.daily_limit,
+        error_rate=args.error_rate,
+    )
+    server = start_fake_api(fake_api, args.port)
+    print(f"Fake API-Football on http://127.0.0.1:{server.server_port}/")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,11 +1,34 @@
 import os
 import pathlib
+import threading
 
-from dotenv import dotenv_values
+_settings = None
+_settings_lock = threading.Lock()
 
 
 def get_settings():
-    return BaseSettings()
+    # Settings are loaded the first time they are needed, and the same instance is
+    # returned from then on
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _settings = BaseSettings()
+    return _settings
+
+
+class LazySettings:
+    # Stand-in for the settings that only loads them (get_settings()) when one of them
+    # is read or changed, so modules can have a module level "settings" without loading
+    # the settings (and reading the secrets) on import
+    def __getattr__(self, name):
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name, value):
+        setattr(get_settings(), name, value)
+
+
+settings = LazySettings()
 
 
 class BaseSettings:
@@ -13,7 +36,11 @@ class BaseSettings:
     PROJECT_DIR = pathlib.Path(os.path.dirname(os.path.abspath(__file__)))
 
     # FOOTBALL API URL
-    FOOTBALL_API_URL = "https://v3.football.api-sports.io/"
+    # Can be overridden with the FOOTBALL_API_URL environment variable, e.g.: to use the
+    # fake API of the benchmarks (benchmarks/fake_api_football.py)
+    FOOTBALL_API_URL = os.environ.get(
+        "FOOTBALL_API_URL", "https://v3.football.api-sports.io/"
+    )
 
     # CURRENT SEASON
     # This is the year the season begins
@@ -31,12 +58,102 @@ class BaseSettings:
     #     -   3: UEFA Europa League
     ACTIVE_LEAGUES = [2, 3, 39, 140, 435]
 
+    # API RATE LIMITS
+    # Max requests per minute allowed by our API-Football plan. Every request made to
+    # the API (from any thread) takes a token from a shared bucket refilled at this pace
+    REQUESTS_PER_MINUTE = 10
+    # Max requests that can be made in a row after some time without requests
+    REQUESTS_BURST = 1
+    # Automatic downloads are refused when this many daily requests (or less) are left
+    REQUESTS_LIMIT_FAILSAFE = 20
+    # The local quota ledger is kept up to date with the response headers, and only
+    # synced with the "status" endpoint once every this many requests
+    API_STATUS_SYNC_INTERVAL = 50
+
+    # CONCURRENT DOWNLOADS
+    # Max number of requests (teams, fixtures, leagues...) downloaded at the same time.
+    # All of them share the rate limits above. Use 1 to download one after another
+    DOWNLOAD_WORKERS = 4
+    # Max number of pages of the same paginated download requested at the same time,
+    # once the first page tells how many there are. Use 1 to request one after another
+    PAGE_WORKERS = 4
+
+    # INCREMENTAL DOWNLOADS
+    # Data downloaded less than this many seconds ago (for the same endpoint and params)
+    # is reused instead of spending a request. Final data (fixtures of seasons before
+    # CURRENT_SEASON, and events of finished matches) is never downloaded again.
+    # Use 0 to always download non final data
+    RAW_DATA_FRESHNESS_SECONDS = 60 * 60
+
+    # RAW DATA STORAGE
+    # How downloaded pages are stored in the raw_data folder (see raw_storage.py):
+    #     - "files": one pretty-printed JSON file per page
+    #     - "bundles": all the pages of a download run in a single gzip JSON Lines file
+    # Both can be read no matter this setting. "python raw_storage.py pack" moves the
+    # existing files to bundles
+    RAW_STORAGE_BACKEND = "files"
+
+    # NORMALIZATION
+    # Processes used to parse raw data files when refreshing the normalizations. With
+    # more than 1, every kind of data (fixtures, events, ...) is also normalized at the
+    # same time. Normalized files are the same no matter the number of workers
+    NORMALIZE_WORKERS = 1
+    # Number of raw data files parsed by a worker process in one go
+    NORMALIZE_CHUNK_SIZE = 200
+    # Also write the normalized records to a SQLite database in newest_data, with a
+    # typed and indexed table per normalized file, in the same pass as the JSON files
+    EXPORT_SQLITE = False
+    SQLITE_FILE_NAME = "newest_data.sqlite3"
+
+    # SCHEDULER (scheduler.py)
+    # Seconds between cycles of the scheduler (planning and running download jobs)
+    SCHEDULER_INTERVAL = 10 * 60
+    # Seconds between downloads of the fixtures of the active leagues, and while there
+    # are matches of today (or before) not finished yet
+    SCHEDULER_FIXTURES_INTERVAL = 6 * 60 * 60
+    SCHEDULER_MATCHDAY_FIXTURES_INTERVAL = 60 * 60
+    # Only the events of matches finished in the last days are downloaded
+    SCHEDULER_EVENTS_DAYS_BACK = 7
+    # The next round of a league is made of its matches up to this many days after its
+    # next match. The squads of their teams are downloaded once per round
+    SCHEDULER_ROUND_DAYS = 4
+
+    # HTTP CLIENT
+    # Keep-alive connections pool to the API. HTTP_POOL_MAXSIZE should not be lower
+    # than DOWNLOAD_WORKERS, or some downloads will wait for a free connection
+    HTTP_POOL_CONNECTIONS = 4
+    HTTP_POOL_MAXSIZE = 8
+    # Seconds to wait for the API to answer a request
+    HTTP_TIMEOUT = 30
+    # Transient errors (429, 5xx, connection errors) are retried up to HTTP_MAX_RETRIES
+    # times waiting a random time up to HTTP_BACKOFF_FACTOR * 2^retry seconds (capped to
+    # HTTP_BACKOFF_MAX), or the time asked by the "Retry-After" header if present. If a
+    # "Retry-After" is longer than HTTP_BACKOFF_MAX, the request is not retried
+    HTTP_MAX_RETRIES = 5
+    HTTP_BACKOFF_FACTOR = 1
+    HTTP_BACKOFF_MAX = 60
+    # Record the metrics of every API request (latency, size, retries, time waiting for
+    # the quota, ...) and normalization (files parsed, records written, time spent) of
+    # a run in "metrics/<run id>.jsonl", and a summary of every run in "metrics/runs.jsonl"
+    RECORD_METRICS = True
+    # Send the API requests through a pool of tor instances, one per socks port (e.g.:
+    # [9050, 9051, 9052, 9053]), instead of directly. Requests go to the least busy
+    # instance ("least_busy") or to each one in turn ("round_robin"), so raise
+    # DOWNLOAD_WORKERS to use them concurrently. Every TOR_ROTATION_INTERVAL seconds
+    # (None to disable it) all the circuits are renewed, one instance at a time
+    TOR_SOCKS_PORTS = []
+    TOR_EXIT_NODES = None
+    TOR_POOL_STRATEGY = "least_busy"
+    TOR_ROTATION_INTERVAL = None
+
     def __init__(self):
         self.load_secrets()
 
     def load_secrets(self):
         # Load the secrets for this environment
         # FOOTBAL_API_KEY
-        secrets = dotenv_values(".env.secrets")
+        from dotenv import dotenv_values
+
+        secrets = dotenv_values(self.PROJECT_DIR / ".env.secrets")
         for key, value in secrets.items():
             setattr(self, key, value)
@@ -1,14 +1,125 @@
 #!/usr/bin/env python
-from copy import deepcopy
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 import datetime
+import functools
 import json
+import threading
 import time
 
-import requests
-from conf import get_settings
+from api_limits import QuotaLedger, RateLimiter
+from conf import settings
+from download_checkpoints import DownloadCheckpoint
+from download_manifest import DownloadManifest
+from job_files import load_job_file, plan_downloads
+from normalized_data import (
+    NormalizationState,
+    NormalizedJsonWriter,
+    NormalizedSqliteExport,
+)
+from raw_storage import (
+    iter_raw_data_paths,
+    raw_data_exists,
+    read_raw_data,
+    write_raw_data,
+)
+from run_metrics import RunMetrics
+
+
+def lazy_singleton(build):
+    # Decorator of the functions building the module singletons: the instance is built
+    # the first time the function is called (from any thread), with the settings of
+    # that moment, and returned from then on. So importing this module (e.g.: in the
+    # worker processes of the normalizations) does not load the settings nor build what
+    # is never used. get.reset() forgets the instance, so the next call builds a new one
+    # (e.g.: after changing the settings in a benchmark)
+    lock = threading.Lock()
+    instance = []
+
+    @functools.wraps(build)
+    def get():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(build())
+        return instance[0]
+
+    get.reset = instance.clear
+    return get
+
+
+@lazy_singleton
+def get_rate_limiter():
+    # Shared by every download, so the per minute and daily limits are respected
+    # globally
+    return RateLimiter(
+        int(settings.REQUESTS_PER_MINUTE), burst=int(settings.REQUESTS_BURST)
+    )
+
+
+@lazy_singleton
+def get_quota_ledger():
+    return QuotaLedger(
+        failsafe_threshold=settings.REQUESTS_LIMIT_FAILSAFE,
+        sync_interval=settings.API_STATUS_SYNC_INTERVAL,
+    )
+
+
+def build_tor_pool():
+    # tor_utils needs stem and tor installed, so it is only imported when it is used
+    from tor_utils import TorPool
+
+    return TorPool(
+        settings.TOR_SOCKS_PORTS,
+        exit_nodes=settings.TOR_EXIT_NODES,
+        strategy=settings.TOR_POOL_STRATEGY,
+        rotation_interval=settings.TOR_ROTATION_INTERVAL,
+    )
+
+
+@lazy_singleton
+def get_api_client():
+    # Pooled keep-alive connections to the API (or a pool of tor instances), shared by
+    # every download thread. requests takes most of the import time of this module, so
+    # it is only imported when the first request is made
+    from http_client import ApiClient
+
+    return ApiClient(
+        session=build_tor_pool() if settings.TOR_SOCKS_PORTS else None,
+        pool_connections=settings.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+        timeout=settings.HTTP_TIMEOUT,
+        max_retries=settings.HTTP_MAX_RETRIES,
+        backoff_factor=settings.HTTP_BACKOFF_FACTOR,
+        backoff_max=settings.HTTP_BACKOFF_MAX,
+    )
 
 
-settings = get_settings()
+@lazy_singleton
+def get_run_metrics():
+    # Metrics of every request and normalization of this run
+    return RunMetrics(
+        settings.PROJECT_DIR / "metrics" if settings.RECORD_METRICS else None
+    )
+
+
+@lazy_singleton
+def get_download_manifest():
+    # Every download made, used by incremental downloads and to find the latest files.
+    # Built from the raw_data folder the first time, if it was written without one
+    download_manifest = DownloadManifest(settings.PROJECT_DIR / "raw_data")
+    download_manifest.rebuild_if_missing()
+    return download_manifest
+
+
+@lazy_singleton
+def get_normalization_state():
+    # Raw files applied to the normalized files, used by incremental normalizations
+    return NormalizationState(
+        settings.PROJECT_DIR / "raw_data" / "normalization_state.json"
+    )
 
 
 # ### API FUNCTIONS ### #
@@ -19,12 +130,7 @@ def check_api_limits():
         "WARNING: check_api_limits() can have a delay of a couple of minutes updating data.\nAvoid making many calls in rapid series trusting the info this function provides."
     )
     # This request does not count towards the daily limit
-    headers = {
-        "x-rapidapi-host": settings.FOOTBALL_API_URL,
-        "x-rapidapi-key": settings.FOOTBALL_API_KEY,
-    }
-    endpoint = settings.FOOTBALL_API_URL + "status"
-    response = requests.get(endpoint, headers=headers)
+    response = request_api(settings.FOOTBALL_API_URL + "status", "status")
     response_json = response.json()
     if response.status_code == 200 and not response_json.get("errors"):
         limits = response_json["response"]["requests"]
@@ -36,20 +142,70 @@ def check_api_limits():
         raise Exception(str(response.__dict__))
 
 
-def download(
-    endpoint, params=None, endpoint_has_no_pagination=True, download_datetime="", bypass_requests_limit_failsafe=False
-):
-    if not params:
-        params = {}
+def wait_for_api_quota(bypass_requests_limit_failsafe=False):
+    # Must be called before every request that counts towards the daily limit.
+    # The "status" endpoint is only requested when the local ledger needs a sync.
+    # Returns the seconds waited
+    start = time.perf_counter()
+    quota_ledger = get_quota_ledger()
+    quota_ledger.sync_if_needed(check_api_limits)
+    quota_ledger.reserve(bypass_requests_limit_failsafe=bypass_requests_limit_failsafe)
+    # Wait for our turn to avoid hitting the API max requests per minute
+    get_rate_limiter().acquire()
+    return time.perf_counter() - start
 
-    # download_datetime is meant to use the same date folder when multiple downloads are called for the same request
-    # download_datetime format is: %Y%m%d_%H%M%SZ  --> e.g.: 20220831_101914Z
-    # if not provided, "now" time is used each time this function is called
-    if not download_datetime:
-        now = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%SZ")
-    else:
-        now = download_datetime
 
+def request_api(url, endpoint, params=None, before_request=None):
+    # GET a URL of the API with the shared client, recording the metrics of the request
+    # (retries included) in the run metrics. "before_request" is called before every
+    # attempt and returns the seconds it waited (e.g.: wait_for_api_quota)
+    headers = {
+        "x-rapidapi-host": settings.FOOTBALL_API_URL,
+        "x-rapidapi-key": settings.FOOTBALL_API_KEY,
+    }
+    stats = {
+        "attempts": 0,
+        "latency": 0.0,
+        "backoff_seconds": 0.0,
+        "quota_wait_seconds": 0.0,
+    }
+
+    def before_attempt():
+        if before_request:
+            stats["quota_wait_seconds"] += before_request()
+
+    def after_attempt(response, elapsed, delay):
+        stats["attempts"] += 1
+        stats["latency"] += elapsed
+        stats["backoff_seconds"] += delay or 0.0
+
+    try:
+        response = get_api_client().get(
+            url,
+            headers=headers,
+            before_request=before_attempt,
+            after_request=after_attempt,
+        )
+    except Exception as e:
+        # Nothing to record if no request was made (e.g.: failsafe triggered)
+        if stats["attempts"]:
+            get_run_metrics().record_request(
+                endpoint, params or {}, None, size=0, error=str(e), **stats
+            )
+        raise
+    remaining = response.headers.get("x-ratelimit-requests-remaining")
+    get_run_metrics().record_request(
+        endpoint,
+        params or {},
+        response.status_code,
+        size=len(response.content),
+        quota_remaining=(int(remaining) if remaining else get_quota_ledger().remaining),
+        **stats,
+    )
+    return response
+
+
+def build_get_string_and_file_name(params):
     # Order params by key
     sorted_keys = sorted(params.keys())
     sorted_params = {key: params[key] for key in sorted_keys}
@@ -66,63 +222,207 @@ def download(
     else:
         file_name = get_string.replace("=", "_").replace("&", "__")
 
-    headers = {
-        "x-rapidapi-host": settings.FOOTBALL_API_URL,
-        "x-rapidapi-key": settings.FOOTBALL_API_KEY,
-    }
+    return get_string, file_name
+
+
+def get_cached_download(endpoint, file_name, max_age, final=False):
+    # Return the paths of the last download of the given endpoint and file_name if its
+    # data is final or it is newer than max_age seconds, and all its files still exist.
+    # When final data is requested, only a download already marked as final is valid,
+    # as a recent one could have been made before the data stopped changing.
+    # Fixtures are only final for the seasons the caller says are over (see
+    # get_final_flags()), no matter how they were marked when downloaded
+    entry = get_download_manifest().get_last_download(endpoint, file_name)
+    if not entry:
+        return None
+    if not entry["final"] or (endpoint == "fixtures" and not final):
+        if final or time.time() - entry["downloaded_at"] > max_age:
+            return None
+    paths = get_download_manifest().get_page_paths(entry)
+    if not all(raw_data_exists(p) for p in paths):
+        return None
+    return paths
+
+
+def download(
+    endpoint,
+    params=None,
+    endpoint_has_no_pagination=True,
+    download_datetime="",
+    bypass_requests_limit_failsafe=False,
+    max_age=None,
+    force=False,
+    final=False,
+    checkpoint=None,
+):
+    # "final" marks the downloaded data as data that will not change anymore (e.g.: the
+    # events of a finished match), so incremental downloads never request it again.
+    # Pages the run of the given checkpoint already downloaded are not requested again
+    if not params:
+        params = {}
+
+    # download_datetime is meant to use the same date folder when multiple downloads are called for the same request
+    # download_datetime format is: %Y%m%d_%H%M%SZ  --> e.g.: 20220831_101914Z
+    # if not provided, "now" time is used each time this function is called
+    if not download_datetime:
+        now = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%SZ")
+    else:
+        now = download_datetime
+
+    get_string, file_name = build_get_string_and_file_name(params)
+
+    # Incremental downloads: do not spend requests on data we already have, if it is
+    # final or was downloaded less than max_age seconds ago (RAW_DATA_FRESHNESS_SECONDS
+    # by default). Use force=True to always download
+    if max_age is None:
+        max_age = int(settings.RAW_DATA_FRESHNESS_SECONDS)
+    if not force:
+        cached_paths = get_cached_download(endpoint, file_name, max_age, final=final)
+        if cached_paths:
+            print(f"Using already downloaded data for: {endpoint}?{get_string}")
+            return cached_paths
+
     dest_folder = settings.PROJECT_DIR / "raw_data" / endpoint / f"{now}"
     # Ensure destination folder exists
     dest_folder.mkdir(parents=True, exist_ok=True)
 
-    paths_to_return = []
-    page_num = 1
-    # Do-while
-    while True:
-        limits = check_api_limits()
-        if not limits["remaining"]:
-            raise Exception(
-                f"Limit reached. No requests left for today. Daily limit is {limits['limit_day']} requests."
+    def download_page(page_num):
+        # Returns the path of the page and its "paging" data
+        dest_file = dest_folder / f"{file_name}__p{page_num}.json"
+        if checkpoint:
+            total = checkpoint.get_page_total(endpoint, file_name, page_num)
+            if total is not None and raw_data_exists(dest_file):
+                print(f"Already downloaded by run {checkpoint.run}: {dest_file.name}")
+                return dest_file, {"current": page_num, "total": total}
+        if endpoint_has_no_pagination:
+            url = settings.FOOTBALL_API_URL + f"{endpoint}?{get_string}"
+            request_params = params
+        else:
+            url = settings.FOOTBALL_API_URL + f"{endpoint}?{get_string}&page={page_num}"
+            request_params = dict(params, page=page_num)
+        print(f"Making request to: {url}")
+        # Transient errors are retried by the client, so only this page is requested again
+        response = request_api(
+            url,
+            endpoint,
+            params=request_params,
+            before_request=lambda: wait_for_api_quota(
+                bypass_requests_limit_failsafe=bypass_requests_limit_failsafe
+            ),
+        )
+        get_quota_ledger().update_from_headers(response.headers)
+        response_json = response.json()
+        if response.status_code == 200 and not response_json.get("errors"):
+            write_raw_data(
+                dest_file, response_json, backend=settings.RAW_STORAGE_BACKEND
             )
-        if limits["remaining"] <= 20 and not bypass_requests_limit_failsafe:
-            # We avoid making requests if remaining requests for the day are 20 or less
-            # to leave room and avoid hitting the limit unadvertedly
-            raise Exception(
-                f"Failsafe triggered. Only 20 or less request left, so only manual downloads with 'bypass_requests_limit_failsafe=True' allowed"
+        else:
+            print("Something went wrong!")
+            raise Exception(str(response.__dict__))
+        if checkpoint:
+            checkpoint.record_page(
+                endpoint, file_name, page_num, response_json["paging"]["total"]
             )
+        return dest_file, response_json["paging"]
+
+    first_page_path, paging = download_page(1)
+    paths_to_return = [first_page_path]
+    # The first page tells how many pages there are, so the rest are requested at the
+    # same time (up to PAGE_WORKERS), within the rate limits shared by every request
+    pages = range(0)
+    if not endpoint_has_no_pagination:
+        pages = range(paging["current"] + 1, paging["total"] + 1)
+    page_workers = min(int(settings.PAGE_WORKERS), len(pages))
+    if page_workers > 1:
+        executor = ThreadPoolExecutor(max_workers=page_workers)
+        try:
+            futures = [executor.submit(download_page, page) for page in pages]
+            paths_to_return += [future.result()[0] for future in futures]
+        finally:
+            # If any page failed, do not request the pending ones
+            executor.shutdown(wait=True, cancel_futures=True)
+    else:
+        paths_to_return += [download_page(page)[0] for page in pages]
 
-        time.sleep(
-            6
-        )  # Sleep to avoid hitting API max connections limit. Cap to 10 per minute
-        dest_file = dest_folder / f"{file_name}__p{page_num}.json"
-        with open(dest_file, "w+") as f:
-            if endpoint_has_no_pagination:
-                endpoint = settings.FOOTBALL_API_URL + f"{endpoint}?{get_string}"
-            else:
-                endpoint = (
-                    settings.FOOTBALL_API_URL
-                    + f"{endpoint}?{get_string}&page={page_num}"
-                )
-            print(f"Making request to: {endpoint}")
-            response = requests.get(endpoint, headers=headers)
-            response_json = response.json()
-            if response.status_code == 200 and not response_json.get("errors"):
-                formatted_response = json.dumps(response_json, indent=2)
-                f.write(formatted_response)
-                paths_to_return.append(dest_file)
-            else:
-                print("Something went wrong!")
-                raise Exception(str(response.__dict__))
+    # A resumed run does not record again the downloads it already completed
+    last_download = get_download_manifest().get_last_download(endpoint, file_name)
+    if not (checkpoint and last_download and last_download["download_datetime"] == now):
+        get_download_manifest().record_download(
+            endpoint, file_name, now, paths_to_return, final=final
+        )
+    return paths_to_return
 
-        # Update current and total pages
-        current_page = response_json["paging"]["current"]
-        total_pages = response_json["paging"]["total"]
 
-        # Exit do-while if already got the last page
-        if endpoint_has_no_pagination or current_page == total_pages:
-            break
-        else:
-            page_num += 1
-    return paths_to_return
+def download_each(
+    downloads,
+    final_flags=None,
+    endpoint_has_no_pagination=True,
+    download_datetime="",
+    bypass_requests_limit_failsafe=False,
+    max_age=None,
+    force=False,
+    checkpoint=None,
+):
+    # Call download() for every (endpoint, params) in downloads, running up to
+    # DOWNLOAD_WORKERS downloads at the same time, no matter their endpoint.
+    # Returns the paths of every download, in the order of downloads, no matter the
+    # order they finish in. final_flags is an optional list of booleans (aligned with
+    # downloads) passed as the "final" argument of each download
+    if not final_flags:
+        final_flags = [False] * len(downloads)
+    if not download_datetime:
+        download_datetime = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%SZ")
+
+    executor = ThreadPoolExecutor(max_workers=int(settings.DOWNLOAD_WORKERS))
+    try:
+        futures = [
+            executor.submit(
+                download,
+                endpoint,
+                params=params,
+                endpoint_has_no_pagination=endpoint_has_no_pagination,
+                download_datetime=download_datetime,
+                bypass_requests_limit_failsafe=bypass_requests_limit_failsafe,
+                max_age=max_age,
+                force=force,
+                final=final,
+                checkpoint=checkpoint,
+            )
+            for (endpoint, params), final in zip(downloads, final_flags)
+        ]
+        return [future.result() for future in futures]
+    finally:
+        # If any download failed (e.g.: failsafe triggered), do not start pending ones
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def download_many(
+    endpoint,
+    params_list,
+    endpoint_has_no_pagination=True,
+    download_datetime="",
+    bypass_requests_limit_failsafe=False,
+    max_age=None,
+    force=False,
+    final_flags=None,
+    checkpoint=None,
+):
+    # Call download() for the same endpoint once per params in params_list (see
+    # download_each()). Returned paths keep the order of params_list (and pages), so the
+    # result is the same as calling download() in a loop
+    data_paths = []
+    for paths in download_each(
+        [(endpoint, params) for params in params_list],
+        final_flags=final_flags,
+        endpoint_has_no_pagination=endpoint_has_no_pagination,
+        download_datetime=download_datetime,
+        bypass_requests_limit_failsafe=bypass_requests_limit_failsafe,
+        max_age=max_age,
+        force=force,
+        checkpoint=checkpoint,
+    ):
+        data_paths += paths
+    return data_paths
 
 
 # ### END OF API FUNCTIONS ### #
@@ -131,164 +431,350 @@ def download(
 # ### DATA NORMALIZING FUNCTIONS ### #
 
 
-def normalize_leagues_and_countries_data(data_paths=None):
-    if not data_paths:
-        raise Exception("No data paths provided")
+# Every iter_*_records() generator parses the given raw data files one at a time and
+# yields (external_id, data) records to be written to the normalized files, so only one
+# raw page is held in memory at a time
 
-    # Normalize leagues and countries
-    countries_info = {}
-    leagues_info = {}
-    for file_path in data_paths:
-        with open(file_path, "r+") as f:
-            file_data = json.loads(f.read())
-            for league_data in file_data["response"]:
-
-                # Data for country
-                country_name = league_data["country"]["name"]
-                if country_name == "World":
-                    # AA is the code we use to refer to "World" that API Football sets as 'null'
-                    # It is ISO3166-1 Alpha-2 compliant, as its a code reserved for "user-assigned code"
-                    # and would never be used to define nothing official in the standard
-                    country_code = "AA"
-                else:
-                    country_code = league_data["country"]["code"]
-
-                countries_info.update({country_code: {"name": country_name}})
-
-                # Data for league
-                external_id = league_data["league"]["id"]
-                leagues_info.update(
-                    {
-                        external_id: {
-                            "name": league_data["league"]["name"],
-                            "country": country_code,
-                        }
-                    }
-                )
 
-    dest_folder = settings.PROJECT_DIR / "newest_data"
-    dest_folder.mkdir(parents=True, exist_ok=True)
-    # Store country data
-    with open(dest_folder / "countries_data.json", "w+") as countries_file:
-        formatted_countries = json.dumps(countries_info, indent=2)
-        countries_file.write(formatted_countries)
+def iter_leagues_and_countries_records(data_paths):
+    # Yields ("countries", country_code, data) and ("leagues", external_id, data)
+    for file_path in data_paths:
+        file_data = read_raw_data(file_path)
+        for league_data in file_data["response"]:
+
+            # Data for country
+            country_name = league_data["country"]["name"]
+            if country_name == "World":
+                # AA is the code we use to refer to "World" that API Football sets as 'null'
+                # It is ISO3166-1 Alpha-2 compliant, as its a code reserved for "user-assigned code"
+                # and would never be used to define nothing official in the standard
+                country_code = "AA"
+            else:
+                country_code = league_data["country"]["code"]
+
+            yield "countries", country_code, {"name": country_name}
+
+            # Data for league
+            external_id = league_data["league"]["id"]
+            yield "leagues", external_id, {
+                "name": league_data["league"]["name"],
+                "country": country_code,
+            }
+
+
+# Status of the matches by the API-Football short status
+END_STATUS = ["FT", "AET", "PEN"]
+NOTEND_STATUS = ["TBD", "NS", "1H", "HT", "2H", "ET", "P", "BT", "PST", "LIVE"]
+INVALID_STATUS = ["SUSP", "INT", "CANC", "ABD", "AWD", "WO", None]
+API_FOOTBALL_STATUS_TRANSLATION = {}
+API_FOOTBALL_STATUS_TRANSLATION.update(dict.fromkeys(END_STATUS, "END"))
+API_FOOTBALL_STATUS_TRANSLATION.update(dict.fromkeys(NOTEND_STATUS, "NOTEND"))
+API_FOOTBALL_STATUS_TRANSLATION.update(dict.fromkeys(INVALID_STATUS, "INVALID"))
+
+# Dates already validated by get_match_date()
+_valid_match_dates = set()
+
+
+def get_match_date(value):
+    # Date of an API-Football datetime (e.g.: "2022-08-12T19:00:00+00:00"), the same
+    # datetime.fromisoformat(value).date().isoformat() returns (the date in its own
+    # offset), without parsing the whole datetime every time: the date part is sliced
+    # and only parsed the first time it is seen, to validate it. Any other format (or an
+    # invalid date) goes through datetime.fromisoformat()
+    date = value[:10]
+    if date in _valid_match_dates and value[10:11] == "T":
+        return date
+    parsed_date = datetime.datetime.fromisoformat(value).date().isoformat()
+    if parsed_date == date:
+        _valid_match_dates.add(date)
+    return parsed_date
+
+
+def iter_matches_records(data_paths):
+    status_translation = API_FOOTBALL_STATUS_TRANSLATION
+    for file_path in data_paths:
+        file_data = read_raw_data(file_path)
+        for match_data in file_data["response"]:
+            fixture = match_data["fixture"]
+            teams = match_data["teams"]
+            yield fixture["id"], {
+                "date": get_match_date(fixture["date"]),
+                "status": status_translation[fixture["status"]["short"]],
+                "home_team_external_id": teams["home"]["id"],
+                "home_team_external_name": teams["home"]["name"],
+                "away_team_external_id": teams["away"]["id"],
+                "away_team_external_name": teams["away"]["name"],
+                "league_id": match_data["league"]["id"],
+            }
+
+
+def iter_players_records(data_paths):
+    for file_path in data_paths:
+        file_data = read_raw_data(file_path)
+        for squad in file_data["response"]:
+            for player in squad["players"]:
+                yield player["id"], {
+                    "name": player["name"],
+                    "position": player["position"].lower(),
+                }
 
-    # Store league data
-    with open(dest_folder / "leagues_data.json", "w+") as leagues_file:
-        formatted_leagues = json.dumps(leagues_info, indent=2)
-        leagues_file.write(formatted_leagues)
 
+# Currently, only scored goals are needed
+VALID_GOALS_DETAIL = frozenset(["normal goal", "own goal", "penalty"])
 
-def normalize_all_matches_for_current_season_and_active_leagues(data_paths=None):
-    if not data_paths:
-        raise Exception("No data paths provided")
 
-    matches_info = {}
-    end_status = ["FT", "AET", "PEN"]
-    notend_status = ["TBD", "NS", "1H", "HT", "2H", "ET", "P", "BT", "PST", "LIVE"]
-    invalid_status = ["SUSP", "INT", "CANC", "ABD", "AWD", "WO", None]
-    api_football_status_translation = {}
-    api_football_status_translation.update(dict.fromkeys(end_status, "END"))
-    api_football_status_translation.update(dict.fromkeys(notend_status, "NOTEND"))
-    api_football_status_translation.update(dict.fromkeys(invalid_status, "INVALID"))
+def iter_events_records(data_paths):
+    # Yields the whole list of events of a match per raw data file
     for file_path in data_paths:
-        with open(file_path, "r+") as f:
-            file_data = json.loads(f.read())
-            for match_data in file_data["response"]:
-                external_id = match_data["fixture"]["id"]
-                date = (
-                    datetime.datetime.fromisoformat(match_data["fixture"]["date"])
-                    .date()
-                    .isoformat()
-                )
-                matches_info.update(
-                    {
-                        external_id: {
-                            "date": date,
-                            "status": api_football_status_translation[
-                                match_data["fixture"]["status"]["short"]
-                            ],
-                            "home_team_external_id": match_data["teams"]["home"]["id"],
-                            "home_team_external_name": match_data["teams"]["home"][
-                                "name"
-                            ],
-                            "away_team_external_id": match_data["teams"]["away"]["id"],
-                            "away_team_external_name": match_data["teams"]["away"][
-                                "name"
-                            ],
-                            "league_id": match_data["league"]["id"],
+        file_data = read_raw_data(file_path)
+        match_events = []
+        for match_event in file_data["response"]:
+            if match_event["type"] == "Goal":
+                event_detail = match_event["detail"].lower()
+                if event_detail in VALID_GOALS_DETAIL:
+                    match_events.append(
+                        {
+                            "team": match_event["team"]["id"],
+                            "player_id": match_event["player"]["id"],
+                            "type": "goal",
+                            "detail": event_detail,
                         }
-                    }
-                )
-
+                    )
+        yield file_data["parameters"]["fixture"], match_events
+
+
+# Normalized files written from each kind of raw data (path identifier)
+NORMALIZED_FILES = {
+    "fixtures": ["matches_data.json"],
+    "fixtures/events": ["events_data.json"],
+    "leagues": ["countries_data.json", "leagues_data.json"],
+    "players/squads": ["players_data.json"],
+}
+
+
+def iter_normalized_records(path_id, data_paths):
+    # Yields (normalized_file_name, external_id, data) for the given kind of raw data
+    if path_id == "leagues":
+        for kind, external_id, data in iter_leagues_and_countries_records(data_paths):
+            yield f"{kind}_data.json", external_id, data
+        return
+
+    iter_records = {
+        "fixtures": iter_matches_records,
+        "fixtures/events": iter_events_records,
+        "players/squads": iter_players_records,
+    }[path_id]
+    normalized_file_name = NORMALIZED_FILES[path_id][0]
+    for external_id, data in iter_records(data_paths):
+        yield normalized_file_name, external_id, data
+
+
+def iter_normalized_records_by_file(path_id, data_paths):
+    # Yields (raw file path, [(normalized_file_name, external_id, data), ...]) for every
+    # raw file, so the records each raw file produced can be told apart
+    for path in data_paths:
+        yield path, list(iter_normalized_records(path_id, [path]))
+
+
+def parse_raw_data_chunk(path_id, data_paths):
+    # Run in worker processes: parse a chunk of raw files of the same kind
+    return list(iter_normalized_records_by_file(path_id, data_paths))
+
+
+def iter_normalized_records_in_processes(path_id, data_paths, process_pool):
+    # Same as iter_normalized_records_by_file(), in the same order, but parsing chunks of
+    # NORMALIZE_CHUNK_SIZE raw files in the given process pool. Only a few chunks are
+    # parsed ahead of the one being yielded, to bound the memory used by results
+    chunk_size = int(settings.NORMALIZE_CHUNK_SIZE)
+    chunks = (
+        data_paths[i : i + chunk_size] for i in range(0, len(data_paths), chunk_size)
+    )
+    pending = deque()
+    for chunk in chunks:
+        pending.append(process_pool.submit(parse_raw_data_chunk, path_id, chunk))
+        if len(pending) > 2 * int(settings.NORMALIZE_WORKERS):
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+
+def open_normalized_writers(stack, normalized_file_names):
+    # Returns {normalized_file_name: [writers]}, closed when the given ExitStack is.
+    # Every record is written to its JSON file in newest_data, and with EXPORT_SQLITE
+    # to its table in the SQLite database too, in a single transaction
     dest_folder = settings.PROJECT_DIR / "newest_data"
-    dest_folder.mkdir(parents=True, exist_ok=True)
-    # Store country data
-    with open(dest_folder / "matches_data.json", "w+") as matches_file:
-        formatted_matches = json.dumps(matches_info, indent=2)
-        matches_file.write(formatted_matches)
+    writers = {
+        name: [stack.enter_context(NormalizedJsonWriter(dest_folder / name))]
+        for name in normalized_file_names
+    }
+    if settings.EXPORT_SQLITE:
+        export = stack.enter_context(
+            NormalizedSqliteExport(dest_folder / settings.SQLITE_FILE_NAME)
+        )
+        for name in normalized_file_names:
+            writers[name].append(export.get_writer(name))
+    return writers
 
 
-def normalize_squads_for_given_teams(data_paths=None):
+def normalize_data(path_id, data_paths, incremental=False, process_pool=None):
+    # Write the normalized files of the given kind of raw data.
+    # By default they are rewritten with the records of data_paths only. With
+    # incremental=True, the records of data_paths are upserted in the existing files.
+    # If a process pool is given, raw files are parsed in it (only for full rewrites)
     if not data_paths:
         raise Exception("No data paths provided")
 
-    players_info = {}
-    for file_path in data_paths:
-        with open(file_path, "r+") as f:
-            file_data = json.loads(f.read())
-            for squad in file_data["response"]:
-                for player in squad["players"]:
-                    external_id = player["id"]
-                    players_info.update(
-                        {
-                            external_id: {
-                                "name": player["name"],
-                                "position": player["position"].lower(),
-                            }
-                        }
-                    )
+    if incremental:
+        upsert_normalized_data(path_id, data_paths)
+        return
+
+    start = time.perf_counter()
+    data_paths = list(data_paths)
+    records_count = dict.fromkeys(NORMALIZED_FILES[path_id], 0)
+    # The normalized files will only have the records of data_paths, so they replace
+    # the raw files applied before in the normalization state (see upsert_normalized_data)
+    path_id_state = {
+        "normalized_until": max(p.parent.name for p in data_paths),
+        "files": {},
+    }
+    with ExitStack() as stack:
+        writers = open_normalized_writers(stack, NORMALIZED_FILES[path_id])
+        if process_pool:
+            files_records = iter_normalized_records_in_processes(
+                path_id, data_paths, process_pool
+            )
+        else:
+            files_records = iter_normalized_records_by_file(path_id, data_paths)
+        for path, file_records in files_records:
+            file_state = path_id_state["files"].setdefault(
+                path.name,
+                {"records": {name: [] for name in NORMALIZED_FILES[path_id]}},
+            )
+            # The newest version if the same raw file is given more than once
+            file_state["version"] = max(file_state.get("version", ""), path.parent.name)
+            records_ids = file_state["records"]
+            for name, external_id, data in file_records:
+                records_count[name] += 1
+                # Keys of the normalized files are strings once stored as JSON
+                records_ids[name].append(str(external_id))
+                for writer in writers[name]:
+                    writer.write(external_id, data)
+    for file_state in path_id_state["files"].values():
+        for name, external_ids in file_state["records"].items():
+            file_state["records"][name] = list(dict.fromkeys(external_ids))
+    get_normalization_state().set(path_id, path_id_state)
+    get_run_metrics().record_normalization(
+        path_id, "full", len(data_paths), records_count, time.perf_counter() - start
+    )
 
+
+def upsert_normalized_data(path_id, data_paths, normalized_until=None):
+    # Update the normalized files of the given kind of raw data with the records of
+    # data_paths, keeping the rest of records. The records a previous version of the same
+    # raw file produced are replaced, and raw files older than the applied version are
+    # skipped. If there is no normalization state for path_id yet, every latest file of
+    # path_id in the download manifest is applied first, on top of the existing
+    # normalized files: their records no applied raw file has are kept as they are.
+    # normalized_until is the date folder every download up to is applied with this call
+    start = time.perf_counter()
     dest_folder = settings.PROJECT_DIR / "newest_data"
-    dest_folder.mkdir(parents=True, exist_ok=True)
-    # Store players data
-    with open(dest_folder / "players_data.json", "w+") as players_file:
-        formatted_players = json.dumps(players_info, indent=2)
-        players_file.write(formatted_players)
+    path_id_state = get_normalization_state().get(path_id)
+    if path_id_state is None:
+        path_id_state = {"normalized_until": "", "files": {}}
+        all_paths = list(
+            get_download_manifest().iter_downloaded_paths(endpoint=path_id)
+        )
+        data_paths = list(data_paths) + all_paths
+        normalized_until = max(
+            [p.parent.name for p in all_paths] + [normalized_until or ""]
+        )
+    normalized_files = {}
+    for name in NORMALIZED_FILES[path_id]:
+        normalized_path = dest_folder / name
+        if normalized_path.exists():
+            with open(normalized_path, "r") as f:
+                normalized_files[name] = json.loads(f.read())
+        else:
+            normalized_files[name] = {}
+
+    # Number of applied raw files each record came from
+    records_sources = {name: {} for name in normalized_files}
+    for file_state in path_id_state["files"].values():
+        for name, external_ids in file_state["records"].items():
+            for external_id in external_ids:
+                sources = records_sources[name]
+                sources[external_id] = sources.get(external_id, 0) + 1
+
+    # Only the newest of the given versions of each raw file, applied from older to newer
+    latest_paths = select_latest_data_paths(data_paths).get(path_id, {})
+    files_count = 0
+    records_count = dict.fromkeys(normalized_files, 0)
+    for file_name, path in sorted(latest_paths.items(), key=lambda i: i[1].parent.name):
+        version = path.parent.name
+        previous_file_state = path_id_state["files"].get(file_name)
+        if previous_file_state and previous_file_state["version"] > version:
+            continue
+
+        files_count += 1
+        file_records = {name: [] for name in normalized_files}
+        for name, external_id, data in iter_normalized_records(path_id, [path]):
+            records_count[name] += 1
+            # Keys of the normalized files are strings once stored as JSON
+            external_id = str(external_id)
+            normalized_files[name][external_id] = data
+            if external_id not in file_records[name]:
+                file_records[name].append(external_id)
+                sources = records_sources[name]
+                sources[external_id] = sources.get(external_id, 0) + 1
+
+        if previous_file_state:
+            # Forget the records of the previous version of this raw file, removing the
+            # ones no other applied raw file has
+            for name, external_ids in previous_file_state["records"].items():
+                for external_id in external_ids:
+                    records_sources[name][external_id] -= 1
+                    if not records_sources[name][external_id]:
+                        del records_sources[name][external_id]
+                        normalized_files[name].pop(external_id, None)
+
+        path_id_state["files"][file_name] = {
+            "version": version,
+            "records": file_records,
+        }
+
+    with ExitStack() as stack:
+        writers = open_normalized_writers(stack, normalized_files)
+        for name, records in normalized_files.items():
+            for external_id, data in records.items():
+                for writer in writers[name]:
+                    writer.write(external_id, data)
+
+    if normalized_until:
+        path_id_state["normalized_until"] = max(
+            path_id_state["normalized_until"], normalized_until
+        )
+    get_normalization_state().set(path_id, path_id_state)
+    get_run_metrics().record_normalization(
+        path_id, "incremental", files_count, records_count, time.perf_counter() - start
+    )
 
 
-def normalize_events_for_given_matches(data_paths=None):
-    if not data_paths:
-        raise Exception("No data paths provided")
+def normalize_leagues_and_countries_data(data_paths=None, incremental=False):
+    normalize_data("leagues", data_paths, incremental=incremental)
 
-    events_info = {}
-    valid_goals_detail = ["normal goal", "own goal", "penalty"]
-    for file_path in data_paths:
-        with open(file_path, "r+") as f:
-            file_data = json.loads(f.read())
-            match_external_id = file_data["parameters"]["fixture"]
-            events_info.update({match_external_id: []})
-            for match_event in file_data["response"]:
-                # Currently, only scored goals are needed
-
-                if match_event["type"] == "Goal":
-                    event_detail = match_event["detail"].lower()
-                    if event_detail in valid_goals_detail:
-                        events_info[match_external_id].append(
-                            {
-                                "team": match_event["team"]["id"],
-                                "player_id": match_event["player"]["id"],
-                                "type": "goal",
-                                "detail": event_detail,
-                            }
-                        )
 
-    dest_folder = settings.PROJECT_DIR / "newest_data"
-    dest_folder.mkdir(parents=True, exist_ok=True)
-    # Store matches events data
-    with open(dest_folder / "events_data.json", "w+") as events_file:
-        formatted_events = json.dumps(events_info, indent=2)
-        events_file.write(formatted_events)
+def normalize_all_matches_for_current_season_and_active_leagues(
+    data_paths=None, incremental=False
+):
+    normalize_data("fixtures", data_paths, incremental=incremental)
+
+
+def normalize_squads_for_given_teams(data_paths=None, incremental=False):
+    normalize_data("players/squads", data_paths, incremental=incremental)
+
+
+def normalize_events_for_given_matches(data_paths=None, incremental=False):
+    normalize_data("fixtures/events", data_paths, incremental=incremental)
 
 
 # ### END OF DATA NORMALIZING FUNCTIONS ### #
@@ -296,59 +782,174 @@ def normalize_events_for_given_matches(data_paths=None):
 # ### COMPLETE DOWNLOAD AND NORMALIZE FUNCTIONS ### #
 
 
-def download_and_normalize_leagues_and_countries():
+def get_normalized_matches():
+    # Return the normalized matches data if available, to know which matches ended
+    matches_path = settings.PROJECT_DIR / "newest_data" / "matches_data.json"
+    if not matches_path.exists():
+        return {}
+    with open(matches_path, "r") as f:
+        return json.loads(f.read())
+
+
+def get_final_flags(downloads):
+    # Whether the data of each (endpoint, params) download is final: the fixtures of
+    # seasons that are over (before CURRENT_SEASON), and the events of the matches
+    # finished according to the normalized matches. Fixtures of the current season are
+    # never final, even if every listed match ended: cups only list the fixtures of the
+    # next round once it is drawn, so they rely on RAW_DATA_FRESHNESS_SECONDS instead
+    matches = None
+    final_flags = []
+    for endpoint, params in downloads:
+        if endpoint == "fixtures":
+            final = int(params["season"]) < int(settings.CURRENT_SEASON)
+        elif endpoint == "fixtures/events":
+            if matches is None:
+                matches = get_normalized_matches()
+            final = matches.get(str(params["fixture"]), {}).get("status") == "END"
+        else:
+            final = False
+        final_flags.append(final)
+    return final_flags
+
+
+def get_download_datetime(checkpoint=None):
+    # Date folder of the downloads of a run: the one of the checkpoint when resuming it
+    if checkpoint:
+        return checkpoint.download_datetime
+    return datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%SZ")
+
+
+def download_and_normalize_leagues_and_countries(checkpoint=None):
     # This function should be called:
     #     - Once per season or year
     #     - Manually if there were some country or league changes that affect us
-    data_paths = download("leagues")
+    now = get_download_datetime(checkpoint)
+    data_paths = download("leagues", download_datetime=now, checkpoint=checkpoint)
     normalize_leagues_and_countries_data(data_paths=data_paths)
 
 
-def download_and_normalize_all_matches_for_current_season_and_active_leagues():
+def download_and_normalize_all_matches_for_current_season_and_active_leagues(
+    checkpoint=None, force=False
+):
     # This function should be called:
     #     - Once per year including all desired league ids
     #     - Each time a new league is required to be activated
-    now = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%SZ")
-    data_paths = []
+    # With force=True the fixtures are downloaded again even if the last download is
+    # fresh enough to be reused (see RAW_DATA_FRESHNESS_SECONDS)
+    now = get_download_datetime(checkpoint)
     season = settings.CURRENT_SEASON
     leagues = settings.ACTIVE_LEAGUES
-    for league_id in leagues:
-        query_params = {"league": league_id, "season": season}
-        data_paths += download("fixtures", params=query_params, download_datetime=now)
+    params_list = [{"league": league_id, "season": season} for league_id in leagues]
+    final_flags = get_final_flags([("fixtures", params) for params in params_list])
+    data_paths = download_many(
+        "fixtures",
+        params_list,
+        download_datetime=now,
+        force=force,
+        final_flags=final_flags,
+        checkpoint=checkpoint,
+    )
     normalize_all_matches_for_current_season_and_active_leagues(data_paths=data_paths)
 
 
-def download_and_normalize_squads_for_given_teams(team_ids=None):
+def download_and_normalize_squads_for_given_teams(team_ids=None, checkpoint=None):
     # This function should be called:
     #     - Once each round to download the squad of the selected matches
     #     - Each time a new team is required to be downloaded
-    now = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%SZ")
-    data_paths = []
+    now = get_download_datetime(checkpoint)
     if not team_ids:
         raise Exception("Team IDs not provided")
 
-    for team_id in team_ids:
-        query_params = {"team": team_id}
-        data_paths += download(
-            "players/squads", params=query_params, download_datetime=now
-        )
-    normalize_squads_for_given_teams(data_paths=data_paths)
+    params_list = [{"team": team_id} for team_id in team_ids]
+    data_paths = download_many(
+        "players/squads", params_list, download_datetime=now, checkpoint=checkpoint
+    )
+    # Keep the players of the rest of teams
+    normalize_squads_for_given_teams(data_paths=data_paths, incremental=True)
 
 
-def download_and_normalize_events_from_given_matches(match_ids=None):
+def download_and_normalize_events_from_given_matches(match_ids=None, checkpoint=None):
     # This function should be called:
     #     - Once after the last match of the round ends
-    now = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%SZ")
-    data_paths = []
+    now = get_download_datetime(checkpoint)
     if not match_ids:
         raise Exception("Match IDs not provided")
 
-    for match_id in match_ids:
-        query_params = {"fixture": match_id}
-        data_paths += download(
-            "fixtures/events", params=query_params, download_datetime=now
+    params_list = [{"fixture": match_id} for match_id in match_ids]
+    final_flags = get_final_flags(
+        [("fixtures/events", params) for params in params_list]
+    )
+    data_paths = download_many(
+        "fixtures/events",
+        params_list,
+        download_datetime=now,
+        final_flags=final_flags,
+        checkpoint=checkpoint,
+    )
+    # Keep the events of the rest of matches
+    normalize_events_for_given_matches(data_paths=data_paths, incremental=True)
+
+
+def download_and_normalize_batch(downloads=None, checkpoint=None):
+    # Run [endpoint, params] downloads of any kind (e.g.: planned from job files, see
+    # job_files.py) at the same time, and normalize every kind of data once at the end,
+    # keeping the records of the rest of the normalized data
+    now = get_download_datetime(checkpoint)
+    if not downloads:
+        raise Exception("Downloads not provided")
+
+    results = download_each(
+        downloads,
+        final_flags=get_final_flags(downloads),
+        download_datetime=now,
+        checkpoint=checkpoint,
+    )
+    data_paths_by_endpoint = {}
+    for (endpoint, _), data_paths in zip(downloads, results):
+        data_paths_by_endpoint.setdefault(endpoint, []).extend(data_paths)
+    for endpoint, data_paths in data_paths_by_endpoint.items():
+        normalize_data(endpoint, data_paths, incremental=True)
+
+
+# Functions that can be run (and resumed) with run_job(), e.g.: from the command line
+JOBS = {
+    "leagues": download_and_normalize_leagues_and_countries,
+    "fixtures": download_and_normalize_all_matches_for_current_season_and_active_leagues,
+    "squads": download_and_normalize_squads_for_given_teams,
+    "events": download_and_normalize_events_from_given_matches,
+    "batch": download_and_normalize_batch,
+}
+
+
+def run_job(job=None, kwargs=None, resume_run=None):
+    # Run one of the JOBS with a checkpoint of the pages it downloads. If it fails
+    # (e.g.: failsafe triggered), the run can be resumed with resume_run=<run>: it
+    # continues into the same date folders, only requests the missing pages and then
+    # normalizes
+    raw_data_path = settings.PROJECT_DIR / "raw_data"
+    if resume_run:
+        checkpoint = DownloadCheckpoint.load(raw_data_path, resume_run)
+        if checkpoint.finished:
+            raise Exception(f"Run {resume_run} already finished")
+        print(f"Resuming run {checkpoint.run}")
+    else:
+        if job not in JOBS:
+            raise Exception(f"Unknown job: {job}")
+        checkpoint = DownloadCheckpoint.create(
+            raw_data_path, job, kwargs or {}, get_download_datetime()
+        )
+        print(f"Starting run {checkpoint.run}")
+
+    try:
+        JOBS[checkpoint.job](checkpoint=checkpoint, **checkpoint.kwargs)
+    except Exception:
+        print(
+            f"Run {checkpoint.run} failed, resume it with: "
+            f"python data_downloader.py --resume {checkpoint.run}"
         )
-    normalize_events_for_given_matches(data_paths=data_paths)
+        raise
+    checkpoint.finish()
+    return checkpoint.run
 
 
 # ### END OF COMPLETE DOWNLOAD AND NORMALIZE FUNCTIONS ### #
@@ -372,75 +973,183 @@ def get_path_identifier(path):
                 continue
 
 
-def deep_dict_merge(a: dict, b: dict) -> dict:
-    result = deepcopy(a)
-    for bk, bv in b.items():
-        av = result.get(bk)
-        if isinstance(av, dict) and isinstance(bv, dict):
-            result[bk] = deep_dict_merge(av, bv)
-        else:
-            result[bk] = deepcopy(bv)
-    return result
-
-
-def refresh_normalizations_using_latest_downloaded_data():
-    # For every raw data category (fixtures, events, players, leagues, ...)
-    # compile paths to the files with the last data available locally in raw_data folder.
-    # For example, if we downloaded events for a given fixture three times, we only keep
-    # the path to the last one of that downloads.
-
-    # Path identifiers and function associations
-    path_id_associations = {
-        "fixtures": normalize_all_matches_for_current_season_and_active_leagues,
-        "fixtures/events": normalize_events_for_given_matches,
-        "leagues": normalize_leagues_and_countries_data,
-        "players/squads": normalize_squads_for_given_teams,
-    }
-
-    # Get all the latest file paths for the given active_path
-    raw_data_path = settings.PROJECT_DIR / "raw_data"
-    all_paths = raw_data_path.rglob("**/*")
-    # filtered_paths structure
+def select_latest_data_paths(all_paths):
+    # Single pass over all_paths keeping, for every path identifier and file name, only
+    # the path inside the newest date folder. For example, if we downloaded events for a
+    # given fixture three times, we only keep the path to the last one of that downloads.
+    # Path identifier and date of each date folder are computed once per folder, as
+    # thousands of files share the same folder
+    # Returned structure
     # {
     #     'players/squad': {
     #         'team_202__p1.json': absolute_path
     #         }
     #     }
     # }
-    filtered_paths = {}
+    folders_info = {}
+    latest_paths = {}
     for item in all_paths:
-        absolute_path = item.absolute()
-        # Path id is the chunk of the path that identifies the type of data, for example:
-        # /a/b/c/raw_data/players/squad/20220909Z/team_1__p1.json
-        # the identifier of that sample data is "players/squad"
-        path_id = get_path_identifier(absolute_path)
-        if absolute_path.name.endswith(".json"):
-            current_folder_date = datetime.datetime.strptime(
-                absolute_path.parts[-2], "%Y%m%d_%H%M%SZ"
+        if not item.name.endswith(".json"):
+            continue
+        date_folder = item.parent
+        folder_info = folders_info.get(date_folder)
+        if folder_info is None:
+            absolute_folder = date_folder.absolute()
+            # Path id is the chunk of the path that identifies the type of data, for example:
+            # /a/b/c/raw_data/players/squad/20220909Z/team_1__p1.json
+            # the identifier of that sample data is "players/squad"
+            folder_info = (
+                latest_paths.setdefault(get_path_identifier(absolute_folder), {}),
+                datetime.datetime.strptime(absolute_folder.name, "%Y%m%d_%H%M%SZ"),
+                absolute_folder,
             )
-            current_file_name = absolute_path.parts[-1]
-            # Check if we already processed a file with the same name
-            previous_file = filtered_paths.get(path_id, {}).get(current_file_name)
-            if previous_file:
-                # Compare dates of previous and current file paths and keep the newest
-                previous_file_date = datetime.datetime.strptime(
-                    previous_file.parts[-2], "%Y%m%d_%H%M%SZ"
-                )
-                if current_folder_date > previous_file_date:
-                    filtered_paths = deep_dict_merge(
-                        filtered_paths, {path_id: {current_file_name: absolute_path}}
-                    )
-            else:
-                filtered_paths = deep_dict_merge(
-                    filtered_paths, {path_id: {current_file_name: absolute_path}}
+            folders_info[date_folder] = folder_info
+        path_id_paths, folder_date, absolute_folder = folder_info
+
+        # Keep the file of the newest folder if we already processed one with the same name
+        file_name = item.name
+        previous = path_id_paths.get(file_name)
+        if previous is None or folder_date > previous[0]:
+            path_id_paths[file_name] = (folder_date, absolute_folder / file_name)
+
+    return {
+        path_id: {file_name: path for file_name, (_, path) in path_id_paths.items()}
+        for path_id, path_id_paths in latest_paths.items()
+    }
+
+
+def refresh_normalizations_using_latest_downloaded_data(
+    use_manifest=True, incremental=False
+):
+    # For every raw data category (fixtures, events, players, leagues, ...)
+    # compile paths to the files with the last data available locally in raw_data folder.
+    # With incremental=True, only the raw files downloaded since the last normalization
+    # of each category are parsed, and their records upserted in the normalized files
+    if incremental:
+
+        def normalize_path_id(path_id):
+            path_id_state = get_normalization_state().get(path_id)
+            since = path_id_state["normalized_until"] if path_id_state else ""
+            new_paths = list(
+                get_download_manifest().iter_downloaded_paths(
+                    endpoint=path_id, since=since
                 )
+            )
+            if not new_paths:
+                # Nothing downloaded since the last normalization
+                return
+            upsert_normalized_data(
+                path_id,
+                new_paths,
+                normalized_until=max(p.parent.name for p in new_paths),
+            )
 
-    # Loop over each association, get all the latest file paths for each data and pass
-    # them to the associated function to create the normalized files with the newest
-    # downloaded data possible
-    for path_id, associated_function in path_id_associations.items():
-        path_id_data = filtered_paths.get(path_id)
-        if path_id_data:
+    else:
+        # Get all the latest file paths for the given active_path
+        raw_data_path = settings.PROJECT_DIR / "raw_data"
+        if use_manifest:
+            # Every file written by download(), without listing the whole raw_data folder.
+            # Run "python download_manifest.py rebuild" if it drifted from the filesystem
+            all_paths = get_download_manifest().iter_downloaded_paths()
+        else:
+            all_paths = iter_raw_data_paths(raw_data_path)
+        filtered_paths = select_latest_data_paths(all_paths)
+
+        # Get all the latest file paths for each data and create the normalized files
+        # with the newest downloaded data possible
+        def normalize_path_id(path_id):
+            path_id_data = filtered_paths.get(path_id)
+            if not path_id_data:
+                # Nothing downloaded yet for this kind of data
+                return
             data_paths = [p for p in path_id_data.values()]
-
-        associated_function(data_paths=data_paths)
+            normalize_data(path_id, data_paths, process_pool=process_pool)
+
+    # With NORMALIZE_WORKERS > 1, raw files are parsed in that many processes, and every
+    # category is normalized at the same time. The normalized files are the same
+    workers = int(settings.NORMALIZE_WORKERS)
+    if workers <= 1:
+        process_pool = None
+        for path_id in NORMALIZED_FILES:
+            normalize_path_id(path_id)
+        return
+
+    # Imported here, as it takes a good part of the import time of this module
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as process_pool, ThreadPoolExecutor(
+        max_workers=len(NORMALIZED_FILES)
+    ) as executor:
+        futures = [
+            executor.submit(normalize_path_id, path_id) for path_id in NORMALIZED_FILES
+        ]
+        for future in futures:
+            future.result()
+
+
+def parse_ids(value):
+    return [int(i) for i in value.split(",") if i.strip()]
+
+
+def plan_batch(job_file_paths):
+    # Downloads of the jobs of every job file, without duplicates (see job_files.py)
+    jobs = []
+    for path in job_file_paths:
+        jobs += load_job_file(path)
+    downloads, duplicates = plan_downloads(
+        jobs,
+        get_normalized_matches(),
+        settings.CURRENT_SEASON,
+        settings.ACTIVE_LEAGUES,
+    )
+    endpoints_count = {}
+    for endpoint, _ in downloads:
+        endpoints_count[endpoint] = endpoints_count.get(endpoint, 0) + 1
+    print(
+        f"{len(jobs)} jobs: {len(downloads)} downloads "
+        f"({duplicates} duplicated left out)"
+    )
+    for endpoint, count in endpoints_count.items():
+        print(f"    {endpoint}: {count}")
+    return downloads
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download and normalize data")
+    parser.add_argument("job", nargs="?", choices=list(JOBS))
+    parser.add_argument("--team-ids", type=parse_ids, help="e.g.: 529,541 (squads)")
+    parser.add_argument("--match-ids", type=parse_ids, help="e.g.: 877972 (events)")
+    parser.add_argument(
+        "--job-file",
+        action="append",
+        default=[],
+        help="JSON file with jobs, can be repeated (batch, see job_files.py)",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only show the batch downloads"
+    )
+    parser.add_argument("--resume", metavar="RUN", help="Resume a failed run")
+    args = parser.parse_args()
+
+    if args.resume:
+        run_job(resume_run=args.resume)
+    elif args.job == "batch":
+        if not args.job_file:
+            parser.error("batch requires at least one --job-file")
+        batch_downloads = plan_batch(args.job_file)
+        if not args.dry_run:
+            run_job("batch", {"downloads": batch_downloads})
+    elif args.job:
+        # Checked before the run starts, as a run without them could never be resumed
+        job_kwargs = {}
+        if args.job == "squads":
+            if not args.team_ids:
+                parser.error("squads requires --team-ids")
+            job_kwargs["team_ids"] = args.team_ids
+        elif args.job == "events":
+            if not args.match_ids:
+                parser.error("events requires --match-ids")
+            job_kwargs["match_ids"] = args.match_ids
+        run_job(args.job, job_kwargs)
+    else:
+        parser.error("A job or --resume is required")
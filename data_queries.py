@@ -0,0 +1,119 @@
+from bisect import bisect_left, bisect_right
+
+
+class QueryError(Exception):
+    # Raised for invalid query parameters
+    pass
+
+
+def parse_ids(value, name):
+    try:
+        return [int(i) for i in value.split(",") if i.strip()]
+    except ValueError:
+        raise QueryError(f"'{name}' must be a comma separated list of integers")
+
+
+class NewestDataIndexes:
+    # Indexes over the normalized data, built once when the normalized files are loaded,
+    # so queries only touch the records they return.
+    # Ids are the string keys of the normalized files
+    def __init__(self, matches, events, players):
+        self.matches = matches
+        self.events = events
+        self.players = players
+
+        # Matches sorted by date (and id), to get date ranges with a binary search
+        self.matches_by_date = sorted(
+            matches, key=lambda match_id: (matches[match_id]["date"], int(match_id))
+        )
+        self.match_dates = [matches[m]["date"] for m in self.matches_by_date]
+        self.match_positions = {m: i for i, m in enumerate(self.matches_by_date)}
+
+        self.matches_by_league = {}
+        self.matches_by_team = {}
+        for match_id, match in matches.items():
+            self.matches_by_league.setdefault(match["league_id"], []).append(match_id)
+            for team_key in ("home_team_external_id", "away_team_external_id"):
+                self.matches_by_team.setdefault(match[team_key], []).append(match_id)
+
+        # {player_id: {match_id: [events]}}
+        self.events_by_player = {}
+        for match_id, match_events in events.items():
+            for event in match_events:
+                player_events = self.events_by_player.setdefault(event["player_id"], {})
+                player_events.setdefault(match_id, []).append(event)
+
+    def query_matches(self, params):
+        # Filters: date_from, date_to (YYYY-MM-DD, both included), league_id, team_id.
+        # Returns {match_id: match} sorted by date
+        candidates = None
+        if "league_id" in params:
+            candidates = self._intersect(
+                candidates, self._lookup(self.matches_by_league, params, "league_id")
+            )
+        if "team_id" in params:
+            candidates = self._intersect(
+                candidates, self._lookup(self.matches_by_team, params, "team_id")
+            )
+        date_from = params.get("date_from")
+        date_to = params.get("date_to")
+        if date_from or date_to:
+            start = bisect_left(self.match_dates, date_from) if date_from else 0
+            end = (
+                bisect_right(self.match_dates, date_to)
+                if date_to
+                else len(self.match_dates)
+            )
+            if candidates is None:
+                match_ids = self.matches_by_date[start:end]
+            else:
+                positions = (self.match_positions[m] for m in candidates)
+                match_ids = [
+                    self.matches_by_date[p]
+                    for p in sorted(positions)
+                    if start <= p < end
+                ]
+        elif candidates is None:
+            raise QueryError(
+                "At least one of 'date_from', 'date_to', 'league_id' or 'team_id' is required"
+            )
+        else:
+            match_ids = sorted(candidates, key=self.match_positions.__getitem__)
+        return {match_id: self.matches[match_id] for match_id in match_ids}
+
+    def query_events(self, params):
+        # Filters: match_id (comma separated list), player_id.
+        # Returns {match_id: [events]}
+        if "player_id" in params:
+            events = self._lookup(
+                self.events_by_player, params, "player_id", default={}
+            )
+        elif "match_id" in params:
+            events = self.events
+        else:
+            raise QueryError("At least one of 'match_id' or 'player_id' is required")
+        if "match_id" in params:
+            match_ids = [str(i) for i in parse_ids(params["match_id"], "match_id")]
+            return {m: events[m] for m in match_ids if m in events}
+        return events
+
+    def query_players(self, params):
+        # Filters: ids (comma separated list). Returns {player_id: player}
+        if "ids" not in params:
+            raise QueryError("'ids' is required")
+        player_ids = [str(i) for i in parse_ids(params["ids"], "ids")]
+        return {p: self.players[p] for p in player_ids if p in self.players}
+
+    @staticmethod
+    def _lookup(index, params, name, default=()):
+        try:
+            value = int(params[name])
+        except ValueError:
+            raise QueryError(f"'{name}' must be an integer")
+        return index.get(value, default)
+
+    @staticmethod
+    def _intersect(candidates, match_ids):
+        if candidates is None:
+            return set(match_ids)
+        return candidates.intersection(match_ids)
@@ -0,0 +1,110 @@
+import json
+import threading
+
+
+class DownloadCheckpoint:
+    # Append-only JSON Lines record of the pages a run (a call to one of the
+    # download_and_normalize_*() functions) has already downloaded, so a run that failed
+    # (e.g.: failsafe triggered) can be resumed into the same date folder, requesting
+    # only the missing pages. It is kept in "raw_data/checkpoints/<run>.jsonl":
+    #     - The first line describes the run:
+    #       {"run": "20220831_101914Z_squads", "job": "squads",
+    #        "kwargs": {"team_ids": [529, 541]},
+    #        "download_datetime": "20220831_101914Z"}
+    #     - Then a line per downloaded page, with the total pages of its download:
+    #       {"endpoint": "players/squads", "file_name": "team_541",
+    #        "page": 1, "total": 1}
+    #     - And a last {"finished": true} line once the run is complete
+    FOLDER_NAME = "checkpoints"
+
+    def __init__(self, path, header, pages=None, finished=False):
+        self.path = path
+        self.header = header
+        self._pages = pages or {}
+        self.finished = finished
+        self._lock = threading.Lock()
+
+    @property
+    def run(self):
+        return self.header["run"]
+
+    @property
+    def job(self):
+        return self.header["job"]
+
+    @property
+    def kwargs(self):
+        return self.header["kwargs"]
+
+    @property
+    def download_datetime(self):
+        return self.header["download_datetime"]
+
+    @classmethod
+    def create(cls, raw_data_path, job, kwargs, download_datetime):
+        run = f"{download_datetime}_{job}"
+        path = raw_data_path / cls.FOLDER_NAME / f"{run}.jsonl"
+        if path.exists():
+            raise Exception(f"Checkpoint of run {run} already exists")
+        header = {
+            "run": run,
+            "job": job,
+            "kwargs": kwargs,
+            "download_datetime": download_datetime,
+        }
+        checkpoint = cls(path, header)
+        checkpoint._append(header)
+        return checkpoint
+
+    @classmethod
+    def load(cls, raw_data_path, run):
+        path = raw_data_path / cls.FOLDER_NAME / f"{run}.jsonl"
+        if not path.exists():
+            raise Exception(f"Checkpoint of run {run} not found")
+        header = None
+        pages = {}
+        finished = False
+        with open(path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Last line cut by a crash
+                    continue
+                if header is None:
+                    header = entry
+                elif entry.get("finished"):
+                    finished = True
+                else:
+                    key = (entry["endpoint"], entry["file_name"], entry["page"])
+                    pages[key] = entry["total"]
+        return cls(path, header, pages=pages, finished=finished)
+
+    def get_page_total(self, endpoint, file_name, page):
+        # Total pages of the download if the page was already downloaded, else None
+        with self._lock:
+            return self._pages.get((endpoint, file_name, page))
+
+    def record_page(self, endpoint, file_name, page, total):
+        with self._lock:
+            self._pages[(endpoint, file_name, page)] = total
+            entry = {
+                "endpoint": endpoint,
+                "file_name": file_name,
+                "page": page,
+                "total": total,
+            }
+            self._append(entry)
+
+    def finish(self):
+        with self._lock:
+            self.finished = True
+            self._append({"finished": True})
+
+    def _append(self, entry):
+        # Must be called holding the lock (or before the checkpoint is shared)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
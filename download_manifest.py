@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+import argparse
+import datetime
+import json
+import os
+import threading
+import time
+
+from raw_storage import list_raw_data_file_names
+
+
+class DownloadManifest:
+    # Append-only JSON Lines record of the downloads made to the "raw_data" folder.
+    # Every line describes one download of an (endpoint, file_name) pair, where
+    # "file_name" is the name download() builds from the params (e.g.: "team_541"), and
+    # the files it wrote to "raw_data/<endpoint>/<download_datetime>/":
+    # {
+    #     "endpoint": "players/squads",
+    #     "file_name": "team_541",
+    #     "download_datetime": "20220831_101914Z",
+    #     "downloaded_at": 1661941154.2,
+    #     "pages": ["team_541__p1.json"],
+    #     "final": false
+    # }
+    # The last line of each pair is its last download. "final" downloads are the ones
+    # whose data will not change anymore (e.g.: events of a finished match), so there is
+    # no need to download them again.
+    # As every written file is listed here, the manifest is also the index used to find
+    # the latest downloaded files without listing the "raw_data" folder. If it drifts
+    # from the files in the folder, it can be rebuilt with:
+    #     python download_manifest.py rebuild
+    FILE_NAME = "download_manifest.jsonl"
+
+    def __init__(self, raw_data_path):
+        self.raw_data_path = raw_data_path
+        self.path = raw_data_path / self.FILE_NAME
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Must be called holding the lock
+        if self._entries is not None:
+            return
+        self._entries = {}
+        for entry in self._read_lines():
+            self._entries[(entry["endpoint"], entry["file_name"])] = entry
+
+    def _read_lines(self):
+        if not self.path.exists():
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def _append(self, entry):
+        # Must be called holding the lock
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        self._entries[(entry["endpoint"], entry["file_name"])] = entry
+
+    def get_page_paths(self, entry):
+        dest_folder = (
+            self.raw_data_path / entry["endpoint"] / entry["download_datetime"]
+        )
+        return [dest_folder / page for page in entry["pages"]]
+
+    def get_last_download(self, endpoint, file_name):
+        with self._lock:
+            self._load()
+            return self._entries.get((endpoint, file_name))
+
+    def record_download(
+        self, endpoint, file_name, download_datetime, page_paths, final=False
+    ):
+        with self._lock:
+            self._load()
+            self._append(
+                {
+                    "endpoint": endpoint,
+                    "file_name": file_name,
+                    "download_datetime": download_datetime,
+                    "downloaded_at": time.time(),
+                    "pages": [p.name for p in page_paths],
+                    "final": final,
+                }
+            )
+
+    def iter_downloaded_paths(self, endpoint=None, since=""):
+        # Paths of every file recorded in the manifest, in the order they were downloaded.
+        # Optionally, only of the given endpoint and/or in date folders newer than "since"
+        for entry in self._read_lines():
+            if endpoint is not None and entry["endpoint"] != endpoint:
+                continue
+            if entry["download_datetime"] <= since:
+                continue
+            yield from self.get_page_paths(entry)
+
+    def rebuild_if_missing(self):
+        # raw_data folders written before the manifest existed have no manifest, so
+        # nothing would be found in them: build it once from the folder. Returns the
+        # number of downloads found, or None if the manifest already exists (or there is
+        # no raw_data folder yet)
+        if self.path.exists() or not self.raw_data_path.exists():
+            return None
+        print(
+            f"No download manifest found in {self.raw_data_path}, building it from the "
+            "raw_data folder, this could take some time"
+        )
+        entries_count = self.rebuild()
+        print(f"Manifest built with {entries_count} downloads")
+        return entries_count
+
+    def rebuild(self):
+        # Rewrite the manifest from the pages actually found in the "raw_data" folder.
+        # This lists the whole folder, so it is slow: only use it to fix a manifest that
+        # drifted from the filesystem (e.g.: files removed or copied by hand)
+        with self._lock:
+            previous_entries = {
+                (e["endpoint"], e["file_name"], e["download_datetime"]): e
+                for e in self._read_lines()
+            }
+            downloads = {}
+            for dir_path, dir_names, file_names in os.walk(self.raw_data_path):
+                dir_names.sort()
+                folder = os.path.basename(dir_path)
+                if not folder.startswith("2"):
+                    # Not a date folder
+                    continue
+                endpoint = os.path.relpath(
+                    os.path.dirname(dir_path), self.raw_data_path
+                )
+                for page in list_raw_data_file_names(dir_path, file_names):
+                    file_name, page_num = page[: -len(".json")].rsplit("__p", 1)
+                    downloads.setdefault((endpoint, file_name, folder), []).append(
+                        (int(page_num), page)
+                    )
+
+            entries = []
+            # Sorted by date, so the last line of each pair is still its last download
+            for (endpoint, file_name, folder), pages in sorted(
+                downloads.items(), key=lambda item: (item[0][2], item[0][0], item[0][1])
+            ):
+                previous_entry = previous_entries.get((endpoint, file_name, folder), {})
+                downloaded_at = datetime.datetime.strptime(
+                    folder, "%Y%m%d_%H%M%SZ"
+                ).replace(tzinfo=datetime.timezone.utc)
+                entries.append(
+                    {
+                        "endpoint": endpoint,
+                        "file_name": file_name,
+                        "download_datetime": folder,
+                        "downloaded_at": previous_entry.get(
+                            "downloaded_at", downloaded_at.timestamp()
+                        ),
+                        "pages": [page for _, page in sorted(pages)],
+                        "final": previous_entry.get("final", False),
+                    }
+                )
+
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "w") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, self.path)
+            self._entries = None
+            return len(entries)
+
+
+if __name__ == "__main__":
+    from conf import get_settings
+
+    parser = argparse.ArgumentParser(
+        description="Manage the raw data download manifest"
+    )
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+
+    settings = get_settings()
+    manifest = DownloadManifest(settings.PROJECT_DIR / "raw_data")
+    if args.command == "rebuild":
+        print(f"Rebuilding {manifest.path}, this could take some time")
+        entries_count = manifest.rebuild()
+        print(f"Manifest rebuilt with {entries_count} downloads")
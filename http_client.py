@@ -0,0 +1,132 @@
+import email.utils
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Status codes worth retrying: rate limited and transient server errors
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+
+class ApiClient:
+    # Pooled keep-alive HTTP client with exponential backoff (with jitter) on transient
+    # errors. The underlying requests session can be replaced (e.g.: a tor session), as
+    # long as it has a "get" method like requests.Session
+    def __init__(
+        self,
+        session=None,
+        pool_connections=4,
+        pool_maxsize=8,
+        timeout=30,
+        max_retries=5,
+        backoff_factor=1,
+        backoff_max=60,
+    ):
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=int(pool_connections), pool_maxsize=int(pool_maxsize)
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+        self.timeout = float(timeout)
+        self.max_retries = int(max_retries)
+        self.backoff_factor = float(backoff_factor)
+        self.backoff_max = float(backoff_max)
+
+    def get(self, url, headers=None, before_request=None, after_request=None):
+        # "before_request" is called before every attempt (retries included), e.g.: to
+        # wait for the rate limiter. "after_request" is called after every attempt with
+        # the response (None if it failed), the seconds it took and the seconds to wait
+        # before retrying it (None if it is not retried), e.g.: to record metrics.
+        # The last response is returned if it is still failing after all the retries (or
+        # if its "Retry-After" is longer than backoff_max), and connection errors are
+        # raised
+        attempt = 0
+        while True:
+            if before_request:
+                before_request()
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                elapsed = time.perf_counter() - start
+                if attempt >= self.max_retries:
+                    if after_request:
+                        after_request(None, elapsed, None)
+                    raise
+                delay = self.get_backoff(attempt)
+                print(f"Request to {url} failed ({e}), retrying in {delay:.1f}s")
+                if after_request:
+                    after_request(None, elapsed, delay)
+            else:
+                elapsed = time.perf_counter() - start
+                delay = None
+                if attempt < self.max_retries and self.is_retryable(response):
+                    delay = self.get_backoff(
+                        attempt, response.headers.get("Retry-After")
+                    )
+                    if delay is None:
+                        print(
+                            f"Request to {url} returned {response.status_code}, not "
+                            f"retried as Retry-After is longer than {self.backoff_max}s"
+                        )
+                if delay is None:
+                    if after_request:
+                        after_request(response, elapsed, None)
+                    return response
+                print(
+                    f"Request to {url} returned {response.status_code}, retrying in {delay:.1f}s"
+                )
+                if after_request:
+                    after_request(response, elapsed, delay)
+            attempt += 1
+            time.sleep(delay)
+
+    def get_backoff(self, attempt, retry_after=None):
+        # Exponential backoff with "full jitter", unless the server told us how long to
+        # wait. None if that is longer than backoff_max, as the thread (and the rest of
+        # pages of its download) would be stuck until then: better give up
+        retry_after_seconds = parse_retry_after(retry_after)
+        if retry_after_seconds is not None:
+            if retry_after_seconds > self.backoff_max:
+                return None
+            return min(
+                self.backoff_max,
+                retry_after_seconds + random.uniform(0, self.backoff_factor),
+            )
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_factor * 2**attempt)
+        )
+
+    @staticmethod
+    def is_retryable(response):
+        if response.status_code in RETRY_STATUS_CODES:
+            return True
+        # API-Football reports the per minute rate limit with a 200 and an error message
+        # (the body is only parsed when it can contain that error)
+        if response.status_code == 200 and b"rateLimit" in response.content:
+            try:
+                errors = response.json().get("errors")
+            except ValueError:
+                return False
+            return isinstance(errors, dict) and "rateLimit" in errors
+        return False
+
+
+def parse_retry_after(value):
+    # "Retry-After" can be either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_date.timestamp() - time.time())
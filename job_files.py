@@ -0,0 +1,119 @@
+import json
+
+# Job files list the data to download at once with
+# "python data_downloader.py batch --job-file <file> [--job-file <file> ...]".
+# They are JSON files with a list of jobs (or a {"jobs": [...]} object):
+#     [
+#         {"kind": "leagues"},
+#         # League ids (of CURRENT_SEASON), or [league id, season] pairs. Without
+#         # "leagues", the ACTIVE_LEAGUES
+#         {"kind": "fixtures", "leagues": [140, [39, 2021]]},
+#         {"kind": "squads", "team_ids": [529, 541]},
+#         {"kind": "events", "match_ids": [877972]},
+#         # Instead of ids, squads (of both teams) and events can be of the
+#         # normalized matches (matches_data.json) that pass the given filters, all of
+#         # them optional
+#         {"kind": "events", "matches": {"league_ids": [140], "status": ["END"],
+#                                        "date_from": "2022-08-01",
+#                                        "date_to": "2022-08-31",
+#                                        "team_ids": [529]}}
+#     ]
+# The jobs of every file are planned as a single list of downloads, without duplicates
+# (e.g.: a team in two files, or in the matches of two filters)
+
+# Endpoint downloaded by every kind of job
+JOB_KINDS = {
+    "leagues": "leagues",
+    "fixtures": "fixtures",
+    "squads": "players/squads",
+    "events": "fixtures/events",
+}
+MATCH_FILTERS = ("league_ids", "status", "date_from", "date_to", "team_ids")
+
+
+def load_job_file(path):
+    with open(path, "r") as f:
+        data = json.loads(f.read())
+    jobs = data["jobs"] if isinstance(data, dict) else data
+    for job in jobs:
+        kind = job.get("kind")
+        if kind not in JOB_KINDS:
+            raise Exception(f"Unknown job kind in {path}: {kind}")
+        unknown_filters = set(job.get("matches", {})) - set(MATCH_FILTERS)
+        if unknown_filters:
+            raise Exception(f"Unknown matches filters in {path}: {unknown_filters}")
+    return jobs
+
+
+def filter_matches(matches, filters):
+    # Ids of the normalized matches ({match_id: data}) that pass every given filter
+    statuses = filters.get("status")
+    if isinstance(statuses, str):
+        statuses = [statuses]
+    league_ids = set(filters.get("league_ids") or [])
+    team_ids = set(filters.get("team_ids") or [])
+    match_ids = []
+    for match_id, match in matches.items():
+        if league_ids and match["league_id"] not in league_ids:
+            continue
+        if statuses and match["status"] not in statuses:
+            continue
+        if filters.get("date_from") and match["date"] < filters["date_from"]:
+            continue
+        if filters.get("date_to") and match["date"] > filters["date_to"]:
+            continue
+        match_team_ids = {
+            match["home_team_external_id"],
+            match["away_team_external_id"],
+        }
+        if team_ids and not match_team_ids & team_ids:
+            continue
+        match_ids.append(int(match_id))
+    return match_ids
+
+
+def get_job_params_list(job, matches, current_season, active_leagues):
+    # Params of every download of a job
+    kind = job["kind"]
+    if kind == "leagues":
+        return [{}]
+    if kind == "fixtures":
+        params_list = []
+        for league in job.get("leagues") or active_leagues:
+            league_id, season = league if isinstance(league, list) else (league, None)
+            params_list.append(
+                {"league": int(league_id), "season": int(season or current_season)}
+            )
+        return params_list
+    if kind == "squads":
+        team_ids = list(job.get("team_ids") or [])
+        if "matches" in job:
+            for match_id in filter_matches(matches, job["matches"]):
+                match = matches[str(match_id)]
+                team_ids += [
+                    match["home_team_external_id"],
+                    match["away_team_external_id"],
+                ]
+        return [{"team": int(team_id)} for team_id in team_ids]
+    match_ids = list(job.get("match_ids") or [])
+    if "matches" in job:
+        match_ids += filter_matches(matches, job["matches"])
+    return [{"fixture": int(match_id)} for match_id in match_ids]
+
+
+def plan_downloads(jobs, matches, current_season, active_leagues):
+    # Returns ([[endpoint, params], ...], number of duplicated downloads left out), in
+    # the order of the jobs
+    downloads = []
+    seen = set()
+    duplicates = 0
+    for job in jobs:
+        endpoint = JOB_KINDS[job["kind"]]
+        for params in get_job_params_list(job, matches, current_season, active_leagues):
+            key = (endpoint, json.dumps(params, sort_keys=True))
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            downloads.append([endpoint, params])
+    return downloads, duplicates
@@ -0,0 +1,384 @@
+from copy import deepcopy
+import json
+from json.encoder import encode_basestring_ascii
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+
+
+class _UnsupportedValue(Exception):
+    pass
+
+
+_INDENTS = ["  " * level for level in range(16)]
+
+
+def _dumps_indented(value, level):
+    # Same text json.dumps(value, indent=2) has for a value nested "level" levels deep,
+    # for the types normalized data is made of (exact str, int, float, bool, None, list,
+    # tuple and dict with str or int keys). It is only the subset of json.encoder needed,
+    # without its per-call setup and generator chain, which is most of the normalization
+    # time on Pythons whose json.dumps(indent=...) has no C speedups (before 3.13).
+    # Anything else raises _UnsupportedValue
+    value_type = type(value)
+    if value_type is str:
+        return encode_basestring_ascii(value)
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if value_type is int:
+        return int.__repr__(value)
+    if value_type is float:
+        if not math.isfinite(value):
+            raise _UnsupportedValue()
+        return float.__repr__(value)
+    if level + 1 >= len(_INDENTS):
+        raise _UnsupportedValue()
+    if value_type is dict:
+        if not value:
+            return "{}"
+        indent = _INDENTS[level + 1]
+        items = []
+        for key, item in value.items():
+            key_type = type(key)
+            if key_type is str:
+                encoded_key = encode_basestring_ascii(key)
+            elif key_type is int:
+                encoded_key = f'"{int.__repr__(key)}"'
+            else:
+                raise _UnsupportedValue()
+            items.append(f"{indent}{encoded_key}: {_dumps_indented(item, level + 1)}")
+        return "{\n" + ",\n".join(items) + "\n" + _INDENTS[level] + "}"
+    if value_type is list or value_type is tuple:
+        if not value:
+            return "[]"
+        indent = _INDENTS[level + 1]
+        items = [f"{indent}{_dumps_indented(item, level + 1)}" for item in value]
+        return "[\n" + ",\n".join(items) + "\n" + _INDENTS[level] + "]"
+    raise _UnsupportedValue()
+
+
+def dumps_record(key, value):
+    # Same text the record has inside json.dumps({..., key: value, ...}, indent=2),
+    # without the surrounding "{\n" and "\n}"
+    try:
+        return _dumps_indented({key: value}, 0)[2:-2]
+    except _UnsupportedValue:
+        return json.dumps({key: value}, indent=2)[2:-2]
+
+
+class NormalizedJsonWriter:
+    # Write a normalized data file (a {external_id: data} dict dumped with indent=2) one
+    # record at a time, so the whole dict is never held in memory.
+    # Records are written to a temporary file next to the destination, which replaces it
+    # atomically when the writer is closed, so readers never see a half written file.
+    # Writing a key twice behaves like dict.update(): the key keeps its first position and
+    # gets the last value. Only the position of each record is kept in memory, to rewrite
+    # the file in that case.
+    # The result is byte-identical to json.dumps(whole_dict, indent=2)
+    #
+    # with NormalizedJsonWriter(path) as writer:
+    #     writer.write(external_id, data)
+    def __init__(self, dest_path):
+        self.dest_path = dest_path
+        self._tmp_file = None
+        self._positions = {}
+        self._has_duplicates = False
+
+    def __enter__(self):
+        self.dest_path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_file = tempfile.NamedTemporaryFile(
+            "wb",
+            dir=self.dest_path.parent,
+            prefix=f".{self.dest_path.name}.",
+            suffix=".tmp",
+            delete=False,
+        )
+        self._tmp_file.write(b"{")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._tmp_file.close()
+            os.unlink(self._tmp_file.name)
+
+    def write(self, key, value):
+        record = dumps_record(key, value).encode()
+        if key in self._positions:
+            self._has_duplicates = True
+        separator = b",\n" if self._positions else b"\n"
+        self._tmp_file.write(separator)
+        self._positions[key] = (self._tmp_file.tell(), len(record))
+        self._tmp_file.write(record)
+
+    def close(self):
+        if not self._positions:
+            self._tmp_file.write(b"}")
+        elif not self._has_duplicates:
+            self._tmp_file.write(b"\n}")
+        self._tmp_file.close()
+        if self._has_duplicates:
+            self._rewrite_without_duplicates()
+        # Temporary files are only readable by the owner
+        os.chmod(self._tmp_file.name, 0o644)
+        os.replace(self._tmp_file.name, self.dest_path)
+
+    def _rewrite_without_duplicates(self):
+        # Copy the last value of every key, in first seen order, to a new temporary file
+        records_path = self._tmp_file.name
+        self._tmp_file = tempfile.NamedTemporaryFile(
+            "wb",
+            dir=self.dest_path.parent,
+            prefix=f".{self.dest_path.name}.",
+            suffix=".tmp",
+            delete=False,
+        )
+        with open(records_path, "rb") as records_file, self._tmp_file as f:
+            f.write(b"{\n")
+            for i, (offset, length) in enumerate(self._positions.values()):
+                if i:
+                    f.write(b",\n")
+                records_file.seek(offset)
+                f.write(records_file.read(length))
+            f.write(b"\n}")
+        os.unlink(records_path)
+
+
+class NormalizationState:
+    # Keeps track, for every kind of raw data (path id, e.g.: "players/squads"), of the
+    # raw files applied to the normalized files, so they can be updated with only the
+    # raw files downloaded since the last normalization:
+    # {
+    #     "players/squads": {
+    #         # Every download up to this date folder is already applied
+    #         "normalized_until": "20220901_101914Z",
+    #         "files": {
+    #             # Raw file name: date folder of the applied version, and the records
+    #             # it produced in every normalized file
+    #             "team_541__p1.json": {
+    #                 "version": "20220901_101914Z",
+    #                 "records": {"players_data.json": ["276", "1100"]}
+    #             }
+    #         }
+    #     }
+    # }
+    def __init__(self, path):
+        self.path = path
+        self._state = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Must be called holding the lock
+        if self._state is not None:
+            return
+        if self.path.exists():
+            with open(self.path, "r") as f:
+                self._state = json.loads(f.read())
+        else:
+            self._state = {}
+
+    def _save(self):
+        # Must be called holding the lock
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps(self._state))
+        os.replace(tmp_path, self.path)
+
+    def get(self, path_id):
+        # A copy, so it can be updated while other kinds of raw data are saved
+        with self._lock:
+            self._load()
+            return deepcopy(self._state.get(path_id))
+
+    def set(self, path_id, path_id_state):
+        with self._lock:
+            self._load()
+            self._state[path_id] = path_id_state
+            self._save()
+
+
+# SQLite tables the normalized files are exported to (see NormalizedSqliteExport):
+# {normalized_file_name: (table, columns, indexed columns, function returning the rows
+# of a record)}
+SQLITE_TABLES = {
+    "countries_data.json": (
+        "countries",
+        [("code", "TEXT PRIMARY KEY"), ("name", "TEXT")],
+        [],
+        lambda key, data: [(key, data["name"])],
+    ),
+    "leagues_data.json": (
+        "leagues",
+        [("id", "INTEGER PRIMARY KEY"), ("name", "TEXT"), ("country", "TEXT")],
+        ["country"],
+        lambda key, data: [(int(key), data["name"], data["country"])],
+    ),
+    "matches_data.json": (
+        "matches",
+        [
+            ("id", "INTEGER PRIMARY KEY"),
+            ("date", "TEXT"),
+            ("status", "TEXT"),
+            ("home_team_external_id", "INTEGER"),
+            ("home_team_external_name", "TEXT"),
+            ("away_team_external_id", "INTEGER"),
+            ("away_team_external_name", "TEXT"),
+            ("league_id", "INTEGER"),
+        ],
+        ["date", "league_id", "home_team_external_id", "away_team_external_id"],
+        lambda key, data: [
+            (
+                int(key),
+                data["date"],
+                data["status"],
+                data["home_team_external_id"],
+                data["home_team_external_name"],
+                data["away_team_external_id"],
+                data["away_team_external_name"],
+                data["league_id"],
+            )
+        ],
+    ),
+    "players_data.json": (
+        "players",
+        [("id", "INTEGER PRIMARY KEY"), ("name", "TEXT"), ("position", "TEXT")],
+        [],
+        lambda key, data: [(int(key), data["name"], data["position"])],
+    ),
+    "events_data.json": (
+        "events",
+        [
+            ("match_id", "INTEGER"),
+            ("position", "INTEGER"),
+            ("team", "INTEGER"),
+            ("player_id", "INTEGER"),
+            ("type", "TEXT"),
+            ("detail", "TEXT"),
+        ],
+        ["match_id", "player_id", "team"],
+        lambda key, events: [
+            (
+                int(key),
+                position,
+                event["team"],
+                event["player_id"],
+                event["type"],
+                event["detail"],
+            )
+            for position, event in enumerate(events)
+        ],
+    ),
+}
+
+
+class NormalizedSqliteExport:
+    # Export of the normalized records to a SQLite database, with a typed table (and
+    # indexes) per normalized file, written in the same pass as the JSON files.
+    # Records are first written to temporary staging tables, only seen by this
+    # connection, so the database is not locked while raw files are parsed (e.g.: by
+    # other normalizations running at the same time). All the tables written with the
+    # same export are replaced with their staging tables in a single transaction when
+    # the export is closed without errors
+    #
+    # with NormalizedSqliteExport(db_path) as export:
+    #     writer = export.get_writer("matches_data.json")
+    #     writer.write(external_id, data)
+    BATCH_SIZE = 1000
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = None
+        self._writers = []
+
+    def __enter__(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Other normalizations can be replacing their tables at the same time
+        self.connection = sqlite3.connect(self.db_path, timeout=300)
+        # Readers are not blocked while a normalization is being written
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                for _, writer in self._writers:
+                    writer.flush()
+                # Staging tables are in the temporary database of the connection
+                self.connection.commit()
+                self.connection.execute("BEGIN IMMEDIATE")
+                self._replace_tables()
+                self.connection.commit()
+            else:
+                self.connection.rollback()
+        finally:
+            self.connection.close()
+
+    def get_writer(self, normalized_file_name):
+        table, columns, _, get_rows = SQLITE_TABLES[normalized_file_name]
+        columns_sql = ", ".join(f"{name} {sql_type}" for name, sql_type in columns)
+        self.connection.execute(f"CREATE TEMP TABLE staging_{table} ({columns_sql})")
+        writer = NormalizedSqliteWriter(
+            self.connection, f"staging_{table}", columns, get_rows
+        )
+        self._writers.append((normalized_file_name, writer))
+        return writer
+
+    def _replace_tables(self):
+        # Must be called holding the write lock. Creates the tables if needed, and
+        # replaces all their rows with the ones of their staging tables
+        for normalized_file_name, _ in self._writers:
+            table, columns, indexed_columns, _ = SQLITE_TABLES[normalized_file_name]
+            columns_sql = ", ".join(f"{name} {sql_type}" for name, sql_type in columns)
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS main.{table} ({columns_sql})"
+            )
+            for column in indexed_columns:
+                self.connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS main.{table}_{column} "
+                    f"ON {table} ({column})"
+                )
+            self.connection.execute(f"DELETE FROM main.{table}")
+            self.connection.execute(
+                f"INSERT INTO main.{table} SELECT * FROM temp.staging_{table}"
+            )
+
+
+class NormalizedSqliteWriter:
+    # Same interface as NormalizedJsonWriter.write(). Rows are inserted in batches.
+    # The first column of the table is the key of the records
+    def __init__(self, connection, table, columns, get_rows):
+        self.connection = connection
+        self.get_rows = get_rows
+        placeholders = ", ".join(["?"] * len(columns))
+        self._insert_sql = f"INSERT OR REPLACE INTO {table} VALUES ({placeholders})"
+        key_column, key_type = columns[0]
+        self._delete_sql = f"DELETE FROM {table} WHERE {key_column} = ?"
+        self._key_is_text = key_type.startswith("TEXT")
+        self._rows = []
+        self._written_keys = set()
+
+    def write(self, key, value):
+        if key in self._written_keys:
+            # Like dict.update(), the last value of a key is kept: remove the rows of the
+            # previous one (some records, as events, have more than one row)
+            self.flush()
+            self.connection.execute(
+                self._delete_sql, (key if self._key_is_text else int(key),)
+            )
+        self._written_keys.add(key)
+        self._rows.extend(self.get_rows(key, value))
+        if len(self._rows) >= NormalizedSqliteExport.BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self._rows:
+            self.connection.executemany(self._insert_sql, self._rows)
+            self._rows = []
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+import argparse
+import functools
+import gzip
+import json
+import os
+import pathlib
+import threading
+
+try:
+    # Optional, faster parsing of the raw data
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+
+# Raw data downloaded by download() is stored under "raw_data/<endpoint>/<date folder>/"
+# with one of these backends:
+#     - "files": every page is its own pretty-printed JSON file
+#       (e.g.: "raw_data/players/squads/20220831_101914Z/team_541__p1.json")
+#     - "bundles": every page of the same date folder is appended as a minified JSON line
+#       to a single gzip file ("bundle.jsonl.gz"), each one as its own gzip member, so the
+#       bundle can be appended to and any page read without decompressing the rest.
+#       "bundle.idx.jsonl" has the offset and length of every page in the bundle.
+#       The whole bundle can also be read as JSON Lines with "zcat bundle.jsonl.gz"
+# Pages of both backends are referred by the same path (the path the file would have),
+# so the rest of the code does not need to know where a page is stored
+FILES_BACKEND = "files"
+BUNDLES_BACKEND = "bundles"
+BUNDLE_FILE_NAME = "bundle.jsonl.gz"
+BUNDLE_INDEX_FILE_NAME = "bundle.idx.jsonl"
+
+_bundle_locks = {}
+_bundle_locks_lock = threading.Lock()
+
+
+def _get_bundle_lock(folder):
+    with _bundle_locks_lock:
+        return _bundle_locks.setdefault(str(folder), threading.Lock())
+
+
+@functools.lru_cache(maxsize=64)
+def _load_bundle_index(folder, index_size):
+    # Cached by the index file size, so pages appended later are found too
+    index = {}
+    with open(os.path.join(folder, BUNDLE_INDEX_FILE_NAME), "r") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                index[entry["name"]] = (entry["offset"], entry["length"])
+    return index
+
+
+def get_bundle_index(folder):
+    try:
+        index_size = os.path.getsize(os.path.join(folder, BUNDLE_INDEX_FILE_NAME))
+    except FileNotFoundError:
+        return {}
+    return _load_bundle_index(str(folder), index_size)
+
+
+def write_raw_data(path, data, backend=FILES_BACKEND):
+    if backend == BUNDLES_BACKEND:
+        folder = path.parent
+        compressed = gzip.compress(
+            (json.dumps(data, separators=(",", ":")) + "\n").encode()
+        )
+        with _get_bundle_lock(folder):
+            with open(folder / BUNDLE_FILE_NAME, "ab") as bundle_file:
+                offset = bundle_file.tell()
+                bundle_file.write(compressed)
+            with open(folder / BUNDLE_INDEX_FILE_NAME, "a") as index_file:
+                index_entry = {
+                    "name": path.name,
+                    "offset": offset,
+                    "length": len(compressed),
+                }
+                index_file.write(json.dumps(index_entry) + "\n")
+    elif backend == FILES_BACKEND:
+        with open(path, "w+") as f:
+            formatted_response = json.dumps(data, indent=2)
+            f.write(formatted_response)
+    else:
+        raise Exception(f"Unknown raw storage backend: {backend}")
+
+
+def read_raw_data(path):
+    # Files are used when they exist, even if the folder also has a bundle
+    try:
+        with open(path, "rb") as f:
+            return json_loads(f.read())
+    except FileNotFoundError:
+        pass
+    position = get_bundle_index(path.parent).get(path.name)
+    if position is None:
+        raise FileNotFoundError(f"Raw data not found: {path}")
+    offset, length = position
+    with open(path.parent / BUNDLE_FILE_NAME, "rb") as bundle_file:
+        bundle_file.seek(offset)
+        return json_loads(gzip.decompress(bundle_file.read(length)))
+
+
+def raw_data_exists(path):
+    return path.exists() or path.name in get_bundle_index(path.parent)
+
+
+def list_raw_data_file_names(folder, file_names):
+    # Names of the pages stored in a date folder, given the names of the files in it
+    names = [name for name in file_names if name.endswith(".json")]
+    if BUNDLE_INDEX_FILE_NAME in file_names:
+        stored_names = set(names)
+        for name in get_bundle_index(folder):
+            if name not in stored_names:
+                names.append(name)
+    return names
+
+
+def iter_raw_data_paths(raw_data_path):
+    # Paths of every page stored in the date folders of the raw_data folder, no matter
+    # its backend. This lists the whole folder, so it is slow
+    for dir_path, dir_names, file_names in os.walk(raw_data_path):
+        dir_names.sort()
+        if not os.path.basename(dir_path).startswith("2"):
+            # Not a date folder
+            continue
+        for name in list_raw_data_file_names(dir_path, sorted(file_names)):
+            yield pathlib.Path(dir_path) / name
+
+
+def pack_folder(folder):
+    # Move the pages stored as files in a date folder to its bundle
+    names = sorted(name for name in os.listdir(folder) if name.endswith(".json"))
+    for name in names:
+        path = folder / name
+        with open(path, "r") as f:
+            data = json.loads(f.read())
+        write_raw_data(path, data, backend=BUNDLES_BACKEND)
+        os.unlink(path)
+    return len(names)
+
+
+if __name__ == "__main__":
+    from conf import get_settings
+
+    parser = argparse.ArgumentParser(description="Manage the raw data storage")
+    parser.add_argument(
+        "command",
+        choices=["pack"],
+        help="pack: move every page stored as a file to the bundle of its date folder",
+    )
+    args = parser.parse_args()
+
+    settings = get_settings()
+    raw_data_path = settings.PROJECT_DIR / "raw_data"
+    if args.command == "pack":
+        packed_count = 0
+        for dir_path, dir_names, file_names in os.walk(raw_data_path):
+            if os.path.basename(dir_path).startswith("2"):
+                packed_count += pack_folder(pathlib.Path(dir_path))
+        print(f"{packed_count} files packed into bundles")
@@ -0,0 +1,148 @@
+import atexit
+import datetime
+import json
+import os
+import threading
+import time
+
+
+class RunMetrics:
+    # Metrics of a run (every process using data_downloader is a run), to see where its
+    # time goes. Every event (an API request, a normalization, ...) is appended as a JSON
+    # line to "<metrics folder>/<run id>.jsonl":
+    #     {"run": "20220901_101914Z_1234", "event": "request", "time": 1662027554.2, ...}
+    # and aggregated in a summary of the run, appended to "<metrics folder>/runs.jsonl"
+    # when the run ends (or write_summary() is called)
+    SUMMARY_FILE_NAME = "runs.jsonl"
+
+    def __init__(self, metrics_path=None):
+        # Without metrics_path nothing is written, the summary is still available
+        self.metrics_path = metrics_path
+        now = datetime.datetime.utcnow()
+        self.run_id = f"{now.strftime('%Y%m%d_%H%M%SZ')}_{os.getpid()}"
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self._requests = {}
+        self._normalizations = {}
+        self._quota_remaining = None
+        self._summary_written = False
+        self._lock = threading.Lock()
+        if metrics_path:
+            atexit.register(self.write_summary)
+
+    def record_request(
+        self,
+        endpoint,
+        params,
+        status,
+        size,
+        attempts,
+        latency,
+        backoff_seconds=0.0,
+        quota_wait_seconds=0.0,
+        quota_remaining=None,
+        error=None,
+    ):
+        # A request to the API, retries included ("latency" is the time of every attempt,
+        # without the time spent sleeping between them or waiting for the quota)
+        event = {
+            "endpoint": endpoint,
+            "params": params,
+            "status": status,
+            "latency": round(latency, 4),
+            "bytes": size,
+            "retries": max(0, attempts - 1),
+            "backoff_seconds": round(backoff_seconds, 4),
+            "quota_wait_seconds": round(quota_wait_seconds, 4),
+            "quota_remaining": quota_remaining,
+        }
+        if error:
+            event["error"] = error
+        with self._lock:
+            totals = self._requests.setdefault(
+                endpoint,
+                {
+                    "requests": 0,
+                    "errors": 0,
+                    "retries": 0,
+                    "bytes": 0,
+                    "latency": 0.0,
+                    "backoff_seconds": 0.0,
+                    "quota_wait_seconds": 0.0,
+                },
+            )
+            totals["requests"] += 1
+            totals["errors"] += 1 if error or status != 200 else 0
+            totals["retries"] += max(0, attempts - 1)
+            totals["bytes"] += size
+            totals["latency"] += latency
+            totals["backoff_seconds"] += backoff_seconds
+            totals["quota_wait_seconds"] += quota_wait_seconds
+            if quota_remaining is not None:
+                self._quota_remaining = quota_remaining
+            self._write("request", event)
+
+    def record_normalization(self, path_id, mode, files, records, seconds):
+        # A normalization of a kind of raw data: raw files parsed, records written to
+        # every normalized file ({normalized_file_name: count}) and time spent
+        event = {
+            "path_id": path_id,
+            "mode": mode,
+            "files": files,
+            "records": records,
+            "seconds": round(seconds, 4),
+        }
+        with self._lock:
+            totals = self._normalizations.setdefault(
+                path_id, {"normalizations": 0, "files": 0, "records": 0, "seconds": 0.0}
+            )
+            totals["normalizations"] += 1
+            totals["files"] += files
+            totals["records"] += sum(records.values())
+            totals["seconds"] += seconds
+            self._write("normalization", event)
+
+    def get_summary(self):
+        with self._lock:
+            requests = {
+                endpoint: {
+                    key: round(value, 4) if isinstance(value, float) else value
+                    for key, value in totals.items()
+                }
+                for endpoint, totals in self._requests.items()
+            }
+            summary = {
+                "run": self.run_id,
+                "started_at": self.started_at,
+                "wall_time": round(time.perf_counter() - self._started, 4),
+                "requests": sum(t["requests"] for t in requests.values()),
+                "requests_by_endpoint": requests,
+                "normalizations": {
+                    path_id: dict(totals, seconds=round(totals["seconds"], 4))
+                    for path_id, totals in self._normalizations.items()
+                },
+                "quota_remaining": self._quota_remaining,
+            }
+        return summary
+
+    def write_summary(self):
+        # Only once per run, and only if something was recorded
+        if not self.metrics_path or self._summary_written:
+            return
+        if not self._requests and not self._normalizations:
+            return
+        summary = self.get_summary()
+        with self._lock:
+            self._summary_written = True
+            self.metrics_path.mkdir(parents=True, exist_ok=True)
+            with open(self.metrics_path / self.SUMMARY_FILE_NAME, "a") as f:
+                f.write(json.dumps(summary) + "\n")
+
+    def _write(self, event_type, event):
+        # Must be called holding the lock
+        if not self.metrics_path:
+            return
+        self.metrics_path.mkdir(parents=True, exist_ok=True)
+        line = {"run": self.run_id, "event": event_type, "time": time.time(), **event}
+        with open(self.metrics_path / f"{self.run_id}.jsonl", "a") as f:
+            f.write(json.dumps(line) + "\n")
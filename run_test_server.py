@@ -1,28 +1,217 @@
 #!/usr/bin/env python
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from email.utils import formatdate, parsedate_to_datetime
+import gzip
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import json
+import pathlib
+import threading
+import urllib.parse
+
+from data_queries import NewestDataIndexes, QueryError
+
+
+NEWEST_DATA_DIR = pathlib.Path(__file__).resolve().parent / "newest_data"
+GZIP_MIN_SIZE = 1024
+
+
+class Representation:
+    # Response body as served: plain and gzipped body and validators
+    def __init__(self, body, last_modified=None):
+        self.body = body
+        self.last_modified = last_modified
+        digest = hashlib.sha1(self.body).hexdigest()
+        # Each representation (plain and gzipped) needs its own ETag
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+        self._gzip_body = None
+
+    @property
+    def gzip_body(self):
+        if self._gzip_body is None:
+            self._gzip_body = gzip.compress(self.body)
+        return self._gzip_body
+
+
+class CachedFile(Representation):
+    # Content of a normalized file, compressed in advance as it is served many times
+    def __init__(self, path, stat_result):
+        with open(path, "rb") as f:
+            body = f.read()
+        super().__init__(body, formatdate(stat_result.st_mtime, usegmt=True))
+        self.mtime_ns = stat_result.st_mtime_ns
+        self.size = stat_result.st_size
+        self._gzip_body = gzip.compress(body)
+        self._data = None
+
+    @property
+    def data(self):
+        # Parsed content, only when needed to build the query indexes
+        if self._data is None:
+            self._data = json.loads(self.body)
+        return self._data
+
+
+class NewestDataCache:
+    # Normalized files are kept in memory, and only read again from disk when their
+    # modification time (or size) changes
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self._files = {}
+        self._indexes = None
+        self._indexes_sources = None
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        # Returns None for unknown names
+        if not name or name.startswith(".") or "/" in name:
+            return None
+        path = self.data_dir / f"{name}.json"
+        try:
+            stat_result = path.stat()
+        except FileNotFoundError:
+            with self._lock:
+                self._files.pop(name, None)
+            return None
+        cached_file = self._files.get(name)
+        if (
+            cached_file is None
+            or cached_file.mtime_ns != stat_result.st_mtime_ns
+            or cached_file.size != stat_result.st_size
+        ):
+            cached_file = CachedFile(path, stat_result)
+            with self._lock:
+                self._files[name] = cached_file
+        return cached_file
+
+    def get_indexes(self):
+        # Query indexes, rebuilt only when any of the files they are built from changes
+        sources = tuple(
+            self.get(name) for name in ("matches_data", "events_data", "players_data")
+        )
+        with self._lock:
+            if self._indexes_sources != sources:
+                self._indexes = NewestDataIndexes(
+                    *(
+                        cached_file.data if cached_file else {}
+                        for cached_file in sources
+                    )
+                )
+                self._indexes_sources = sources
+            return self._indexes
+
+
+newest_data_cache = NewestDataCache(NEWEST_DATA_DIR)
+
+
+# Query endpoints and the NewestDataIndexes method that answers them
+QUERIES = {
+    "matches": "query_matches",
+    "events": "query_events",
+    "players": "query_players",
+}
 
 
 class Server(BaseHTTPRequestHandler):
-    def _set_headers(self):
-        self.send_response(200)
-        self.send_header("Content-type", "application/json")
+    # Serves the normalized files by name, e.g.: GET /matches_data
+    # and queries over them, e.g.:
+    #     GET /matches?date_from=2022-09-10&date_to=2022-09-11&league_id=140&team_id=529
+    #     GET /events?match_id=877972,877973  or  GET /events?player_id=2737
+    #     GET /players?ids=2737,46267
+    protocol_version = "HTTP/1.1"
+
+    def _get_representation(self):
+        # Returns (status, representation or error body)
+        url = urllib.parse.urlsplit(self.path)
+        name = url.path.rstrip("/").split("/")[-1]
+        if name in QUERIES:
+            params = dict(urllib.parse.parse_qsl(url.query))
+            query = getattr(newest_data_cache.get_indexes(), QUERIES[name])
+            try:
+                result = query(params)
+            except QueryError as e:
+                return 400, json.dumps({"error": str(e)}).encode()
+            return 200, Representation(json.dumps(result).encode())
+
+        cached_file = newest_data_cache.get(name)
+        if cached_file is None:
+            return 404, b'{"error": "Not found"}'
+        return 200, cached_file
+
+    def _is_not_modified(self, representation):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            etags = [etag.strip() for etag in if_none_match.split(",")]
+            return (
+                "*" in etags
+                or representation.etag in etags
+                or representation.gzip_etag in etags
+            )
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since and isinstance(representation, CachedFile):
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return representation.mtime_ns // 1_000_000_000 <= since
+        return False
+
+    def _accepts_gzip(self):
+        accept_encoding = self.headers.get("Accept-Encoding", "")
+        for coding in accept_encoding.split(","):
+            parts = coding.strip().split(";")
+            if parts[0].strip() == "gzip":
+                return not any(p.strip() in ("q=0", "q=0.0") for p in parts[1:])
+        return False
+
+    def _send(self, status, body=b"", content_type="application/json", headers=None):
+        self.send_response(status)
+        if body or status == 200:
+            self.send_header("Content-type", content_type)
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
         self.end_headers()
+        return body
+
+    def _respond(self):
+        # Returns the body to write for GET requests (HEAD requests do not write it)
+        status, representation = self._get_representation()
+        if status != 200:
+            return self._send(status, representation)
+
+        # Small responses are not worth compressing
+        accepts_gzip = self._accepts_gzip() and len(representation.body) > GZIP_MIN_SIZE
+        headers = {
+            "ETag": representation.gzip_etag if accepts_gzip else representation.etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        if representation.last_modified:
+            headers["Last-Modified"] = representation.last_modified
+        if self._is_not_modified(representation):
+            return self._send(304, headers=headers)
+        if accepts_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return self._send(200, representation.gzip_body, headers=headers)
+        return self._send(200, representation.body, headers=headers)
 
     def do_HEAD(self):
-        self._set_headers()
+        self._respond()
 
     def do_GET(self):
-        request_path = self.path
-        file_to_retrieve = request_path.split("/")[-1]
-        with open(f"./newest_data/{file_to_retrieve}.json", "rb") as f:
-            self._set_headers()
-            self.wfile.write(f.read())
+        body = self._respond()
+        if body:
+            self.wfile.write(body)
 
 
-def run(server_class=HTTPServer, handler_class=Server, port=8008):
+def run(server_class=ThreadingHTTPServer, handler_class=Server, port=8008):
+    # ThreadingHTTPServer handles every client in its own thread, so slow clients do not
+    # block the rest
     server_address = ("", port)
     httpd = server_class(server_address, handler_class)
+    httpd.daemon_threads = True
     print(f"Starting httpd on port {port}...")
     httpd.serve_forever()
 
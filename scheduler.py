@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# Long running scheduler of the downloads, instead of calling the
+# download_and_normalize_*() functions by hand. Every SCHEDULER_INTERVAL seconds it:
+#     - Plans the jobs needed from the normalized matches (matches_data.json):
+#         - "fixtures": the fixtures of the active leagues, every
+#           SCHEDULER_FIXTURES_INTERVAL seconds, or SCHEDULER_MATCHDAY_FIXTURES_INTERVAL
+#           while there are recent matches (of today or before) not finished, to learn
+#           which matches end
+#         - "events": the events of every match finished in the last
+#           SCHEDULER_EVENTS_DAYS_BACK days whose final events were not downloaded yet
+#         - "squads": the squads of the teams playing in the next round of every league
+#           (matches up to SCHEDULER_ROUND_DAYS days after its next match)
+#     - Runs the jobs its share of the daily quota allows, so the requests left for the
+#       day are spread until the quota resets (00:00 UTC)
+# Jobs are kept in a persistent queue (raw_data/download_queue.json), so pending jobs
+# are run after a crash or restart.
+#
+# Usage: python scheduler.py [--once]
+import argparse
+import datetime
+import json
+import os
+import time
+
+import data_downloader
+from data_downloader import build_get_string_and_file_name, settings
+
+
+# Job kinds: priority (lower first), requests each job costs, and function downloading
+# (and normalizing) the given job ids at once
+JOB_KINDS = {
+    "fixtures": (
+        0,
+        lambda: len(settings.ACTIVE_LEAGUES),
+        # Forced, or a download newer than RAW_DATA_FRESHNESS_SECONDS would be reused
+        lambda ids: data_downloader.download_and_normalize_all_matches_for_current_season_and_active_leagues(
+            force=True
+        ),
+    ),
+    "events": (
+        1,
+        lambda: 1,
+        lambda ids: data_downloader.download_and_normalize_events_from_given_matches(
+            match_ids=ids
+        ),
+    ),
+    "squads": (
+        2,
+        lambda: 1,
+        lambda ids: data_downloader.download_and_normalize_squads_for_given_teams(
+            team_ids=ids
+        ),
+    ),
+}
+
+# Done jobs are remembered this long, so they are not planned again
+DONE_JOBS_RETENTION_SECONDS = 60 * 24 * 60 * 60
+
+
+class DownloadQueue:
+    # Jobs of the scheduler, saved after every change:
+    # {
+    #     # Pending jobs, identified by a key that is never planned again once done
+    #     "jobs": [
+    #         {"key": "events:877972", "kind": "events", "id": 877972,
+    #          "attempts": 0, "not_before": 1662027554.2}
+    #     ],
+    #     # Key of every done job and when it was done
+    #     "done": {"squads:529:2022-09-10": 1662027554.2},
+    #     # Requests of the daily quota the scheduler can spend, see spend_quota()
+    #     "credit": 0.4,
+    #     # When the fixtures were last downloaded by a fixtures job
+    #     "last_fixtures_refresh": 1662027554.2
+    # }
+    def __init__(self, path):
+        self.path = path
+        self.state = {"jobs": [], "done": {}, "credit": 0.0, "last_fixtures_refresh": 0}
+        if path.exists():
+            with open(path, "r") as f:
+                self.state.update(json.loads(f.read()))
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps(self.state, indent=2))
+        os.replace(tmp_path, self.path)
+
+    def add(self, kind, job_id, key):
+        # Returns False if the job is already pending or was done
+        if key in self.state["done"] or any(
+            job["key"] == key for job in self.state["jobs"]
+        ):
+            return False
+        self.state["jobs"].append(
+            {"key": key, "kind": kind, "id": job_id, "attempts": 0, "not_before": 0}
+        )
+        return True
+
+    def get_runnable_jobs(self, budget, now):
+        # Pending jobs, by priority and then oldest first, while their cost fits in the
+        # budget (a job that does not fit waits for more budget, even if the next ones
+        # are cheaper, so it is not delayed forever)
+        jobs = [job for job in self.state["jobs"] if job["not_before"] <= now]
+        jobs.sort(key=lambda job: JOB_KINDS[job["kind"]][0])
+        runnable = []
+        for job in jobs:
+            cost = JOB_KINDS[job["kind"]][1]()
+            if cost > budget:
+                break
+            runnable.append(job)
+            budget -= cost
+        return runnable
+
+    def mark_done(self, jobs, now):
+        keys = {job["key"] for job in jobs}
+        self.state["jobs"] = [
+            job for job in self.state["jobs"] if job["key"] not in keys
+        ]
+        for key in keys:
+            self.state["done"][key] = now
+
+    def mark_failed(self, jobs, now):
+        # Retried later, waiting longer after every failed attempt (up to a day)
+        for job in jobs:
+            job["attempts"] += 1
+            job["not_before"] = now + min(24 * 60 * 60, 60 * 2 ** job["attempts"])
+
+    def prune(self, now):
+        self.state["done"] = {
+            key: done_at
+            for key, done_at in self.state["done"].items()
+            if now - done_at < DONE_JOBS_RETENTION_SECONDS
+        }
+
+    def spend_quota(self, usable_requests, interval, now):
+        # Every cycle with pending jobs earns its share of the usable requests left for
+        # the day, so they last until the quota resets. Returns the requests the jobs can
+        # spend now
+        if not self.state["jobs"]:
+            self.state["credit"] = 0.0
+        utc_now = datetime.datetime.utcfromtimestamp(now)
+        next_reset = datetime.datetime.combine(
+            utc_now.date() + datetime.timedelta(days=1), datetime.time()
+        )
+        seconds_left = max((next_reset - utc_now).total_seconds(), 1)
+        share = usable_requests * min(1, interval / seconds_left)
+        self.state["credit"] = min(usable_requests, self.state["credit"] + share)
+        return int(self.state["credit"])
+
+
+def get_usable_requests():
+    # Requests left for today before the failsafe is triggered
+    quota_ledger = data_downloader.get_quota_ledger()
+    quota_ledger.sync_if_needed(data_downloader.check_api_limits)
+    remaining = quota_ledger.remaining or 0
+    return max(0, remaining - int(settings.REQUESTS_LIMIT_FAILSAFE))
+
+
+def plan_jobs(queue, matches, now):
+    # Adds the jobs needed according to the normalized matches. Returns how many
+    today = datetime.datetime.utcfromtimestamp(now).date()
+    added = 0
+
+    events_since = (
+        today - datetime.timedelta(days=int(settings.SCHEDULER_EVENTS_DAYS_BACK))
+    ).isoformat()
+    matchday = any(
+        match["status"] == "NOTEND"
+        and events_since <= match["date"] <= today.isoformat()
+        for match in matches.values()
+    )
+    fixtures_interval = int(
+        settings.SCHEDULER_MATCHDAY_FIXTURES_INTERVAL
+        if matchday
+        else settings.SCHEDULER_FIXTURES_INTERVAL
+    )
+    fixtures_pending = any(job["kind"] == "fixtures" for job in queue.state["jobs"])
+    if (
+        not fixtures_pending
+        and now - queue.state["last_fixtures_refresh"] >= fixtures_interval
+    ):
+        # Keyed by time, so it is planned again after every interval
+        queue.add("fixtures", None, f"fixtures:{int(now)}")
+        added += 1
+
+    # Events of newly finished matches
+    for match_id, match in matches.items():
+        if match["status"] != "END" or match["date"] < events_since:
+            continue
+        _, file_name = build_get_string_and_file_name({"fixture": match_id})
+        entry = data_downloader.get_download_manifest().get_last_download(
+            "fixtures/events", file_name
+        )
+        if entry and entry["final"]:
+            continue
+        if queue.add("events", int(match_id), f"events:{match_id}"):
+            added += 1
+
+    # Squads of the teams of the next round of every league
+    next_match_dates = {}
+    for match in matches.values():
+        if match["status"] == "NOTEND" and match["date"] >= today.isoformat():
+            league_id = match["league_id"]
+            if match["date"] < next_match_dates.get(league_id, "9999"):
+                next_match_dates[league_id] = match["date"]
+    for match in matches.values():
+        round_start = next_match_dates.get(match["league_id"])
+        if not round_start or match["status"] != "NOTEND":
+            continue
+        round_end = datetime.date.fromisoformat(round_start) + datetime.timedelta(
+            days=int(settings.SCHEDULER_ROUND_DAYS)
+        )
+        if not round_start <= match["date"] < round_end.isoformat():
+            continue
+        for team_key in ("home_team_external_id", "away_team_external_id"):
+            team_id = match[team_key]
+            if queue.add("squads", team_id, f"squads:{team_id}:{round_start}"):
+                added += 1
+    return added
+
+
+def run_jobs(queue, jobs, now):
+    # Jobs of the same kind are downloaded (and normalized) at once
+    for kind in JOB_KINDS:
+        kind_jobs = [job for job in jobs if job["kind"] == kind]
+        if not kind_jobs:
+            continue
+        print(f"Scheduler: running {len(kind_jobs)} {kind} jobs")
+        # Failed jobs may have spent their requests too
+        queue.state["credit"] -= len(kind_jobs) * JOB_KINDS[kind][1]()
+        try:
+            JOB_KINDS[kind][2]([job["id"] for job in kind_jobs])
+        except Exception as e:
+            print(f"Scheduler: {kind} jobs failed, they will be retried later: {e}")
+            queue.mark_failed(kind_jobs, now)
+        else:
+            queue.mark_done(kind_jobs, now)
+            if kind == "fixtures":
+                # Counted from the actual download, not from when the job was planned
+                queue.state["last_fixtures_refresh"] = now
+        queue.save()
+
+
+def run_cycle(queue, interval):
+    now = time.time()
+    queue.prune(now)
+    added = plan_jobs(queue, data_downloader.get_normalized_matches(), now)
+    queue.save()
+
+    budget = queue.spend_quota(get_usable_requests(), interval, now)
+    jobs = queue.get_runnable_jobs(budget, now)
+    queue.save()
+    print(
+        f"Scheduler: {added} new jobs, {len(queue.state['jobs'])} pending, "
+        f"{len(jobs)} to run with {budget} requests"
+    )
+    run_jobs(queue, jobs, now)
+
+
+def run(once=False):
+    interval = int(settings.SCHEDULER_INTERVAL)
+    queue = DownloadQueue(settings.PROJECT_DIR / "raw_data" / "download_queue.json")
+    while True:
+        try:
+            run_cycle(queue, interval)
+        except Exception as e:
+            # e.g.: the API is unreachable, try again in the next cycle
+            print(f"Scheduler: cycle failed: {e}")
+        if once:
+            return
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Schedule the downloads")
+    parser.add_argument("--once", action="store_true", help="Run a single cycle")
+    args = parser.parse_args()
+    try:
+        run(once=args.once)
+    except KeyboardInterrupt:
+        print("Scheduler stopped")
@@ -1,14 +1,16 @@
 from pathlib import Path
 import shutil
+import threading
 
-from stem import Signal
-from stem.control import Controller
-import stem.process
 import requests
 
-tor_path = shutil.which("tor")
-if not tor_path:
-    raise Exception("It is mandatory to install 'tor' first")
+
+def get_tor_path():
+    # Checked when a tor instance is launched, not on import
+    tor_path = shutil.which("tor")
+    if not tor_path:
+        raise Exception("It is mandatory to install 'tor' first")
+    return tor_path
 
 
 class Tor:
@@ -21,6 +23,9 @@ class Tor:
         self.renew_connection()
 
     def renew_connection(self):
+        # Only Tor needs stem, so TorPool can be used with other instances without it
+        import stem.process
+
         print("Renewing tor circuit, this could take some time. Please be patient")
         if self.tor_process:
             self.tor_process.kill()
@@ -33,7 +38,7 @@ class Tor:
         if self.exit_nodes:
             tor_config.update({"ExitNodes": f"{{{self.exit_nodes}}}"})
         self.tor_process = stem.process.launch_tor_with_config(
-            tor_cmd=tor_path, take_ownership=True, config=tor_config
+            tor_cmd=get_tor_path(), take_ownership=True, config=tor_config
         )
 
         self.session = requests.session()
@@ -43,3 +48,121 @@ class Tor:
             "https": f"socks5://127.0.0.1:{self.socks_port}",
         }
         print("Connection renewed!")
+
+
+class TorPool:
+    # Several tor instances, each one on its own socks port (and data directory), so
+    # requests can be sent through different circuits at the same time.
+    # It has the same "get" method as requests.Session (so it can be the session of an
+    # ApiClient): every request is sent through the least busy instance (or the next one
+    # with strategy="round_robin").
+    # With rotation_interval, circuits are renewed in the background, one instance at a
+    # time, so the rest keep serving requests while it is rebuilt.
+    # "tor_factory(socks_port, exit_nodes)" builds the instances: anything with the
+    # "socks_port" and "session" attributes and a "renew_connection" method of Tor (e.g.:
+    # a stub for tests)
+    #
+    # with TorPool([9050, 9051, 9052], rotation_interval=600) as tor_pool:
+    #     response = tor_pool.get(url, headers=headers, timeout=30)
+    LEAST_BUSY = "least_busy"
+    ROUND_ROBIN = "round_robin"
+
+    def __init__(
+        self,
+        socks_ports,
+        exit_nodes=None,
+        strategy=LEAST_BUSY,
+        rotation_interval=None,
+        tor_factory=Tor,
+    ):
+        if strategy not in (self.LEAST_BUSY, self.ROUND_ROBIN):
+            raise Exception(f"Unknown tor pool strategy: {strategy}")
+        if not socks_ports:
+            raise Exception("A tor pool needs at least one socks port")
+        self.strategy = strategy
+        self.rotation_interval = rotation_interval
+        self.instances = [tor_factory(port, exit_nodes) for port in socks_ports]
+        # Requests in flight of every instance, and instances being renewed
+        self._busy = [0] * len(self.instances)
+        self._renewing = set()
+        self._next = 0
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._rotation_thread = None
+        if rotation_interval:
+            self._rotation_thread = threading.Thread(
+                target=self._rotate_circuits, name="tor-pool-rotation", daemon=True
+            )
+            self._rotation_thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, url, **kwargs):
+        index = self._acquire()
+        try:
+            return self.instances[index].session.get(url, **kwargs)
+        finally:
+            self._release(index)
+
+    def renew(self, index):
+        # Renew the circuit of an instance once its requests in flight finish. New
+        # requests go to the other instances meanwhile
+        with self._condition:
+            if index in self._renewing:
+                return
+            self._renewing.add(index)
+            self._condition.wait_for(lambda: not self._busy[index])
+        try:
+            self.instances[index].renew_connection()
+        finally:
+            with self._condition:
+                self._renewing.discard(index)
+                self._condition.notify_all()
+
+    def close(self):
+        self._stop.set()
+        if self._rotation_thread:
+            self._rotation_thread.join()
+        for instance in self.instances:
+            tor_process = getattr(instance, "tor_process", None)
+            if tor_process:
+                tor_process.kill()
+
+    def _acquire(self):
+        # Index of the instance the next request goes through
+        with self._condition:
+            self._condition.wait_for(lambda: len(self._renewing) < len(self.instances))
+            available = [
+                i for i in range(len(self.instances)) if i not in self._renewing
+            ]
+            if self.strategy == self.ROUND_ROBIN:
+                index = min(
+                    available, key=lambda i: (i - self._next) % len(self.instances)
+                )
+                self._next = index + 1
+            else:
+                index = min(available, key=self._busy.__getitem__)
+            self._busy[index] += 1
+            return index
+
+    def _release(self, index):
+        with self._condition:
+            self._busy[index] -= 1
+            self._condition.notify_all()
+
+    def _rotate_circuits(self):
+        # Renews every instance in turn, one every rotation_interval / len(instances)
+        # seconds, so every circuit is renewed each rotation_interval
+        interval = self.rotation_interval / len(self.instances)
+        index = 0
+        while not self._stop.wait(interval):
+            try:
+                self.renew(index)
+            except Exception as e:
+                port = self.instances[index].socks_port
+                print(f"Could not renew tor circuit on port {port}: {e}")
+            index = (index + 1) % len(self.instances)